@@ -0,0 +1,214 @@
+"""
+Aggregate layer for the dashboard charts.
+
+ColumnCodes factorizes the year and every categorical column of the clean frame
+once per dataset version. AggregateCube is built from those codes: the study
+counts by (year, category) for every categorical column are one np.bincount per
+column, and the per-year summaries of the numeric columns are a single
+groupby. A cube can be built for any subset of rows (a filter selection)
+without touching the frame again. The charts read small slices of it (a value
+count, a Period pivot, a yearly median), so their cost depends on the number of
+years and categories, not on the number of rows.
+
+When rows are added, removed or changed, updated() derives the new cube from
+the old one: counts are adjusted by the cubes of the rows that left and
+arrived, and the numeric summaries (medians and quartiles are not additive) are
+recomputed for the affected years only. digest() fingerprints parts of a cube,
+so a chart drawn from parts that did not change can be reused.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import normalize
+
+YEAR_COLUMN = 'IDyear'
+
+CATEGORICAL_COLUMNS = [
+    'Caspecialty', 'Caquali', 'JournalLoc', 'JournalScop', 'Article', 'Field',
+    'Level', 'Class', 'CatQuanti', 'DataCollect', 'Setting', 'Setting.1',
+    'Condition_primary', 'Condition_secondary', 'SubjMeasure', 'ObjMeasure',
+    'Intervention',
+]
+NUMERIC_COLUMNS = ['AuthorNum', 'InstitNum', 'AuthorOvNum', 'InstitOvNum']
+# Column pairs counted jointly (the sunburst hierarchy).
+PAIR_COLUMNS = [('JournalLoc', 'JournalScop')]
+
+QUANTILES = {'q1': 0.25, 'median': 0.5, 'q3': 0.75}
+
+# Every column the cube (and so every matplotlib chart) is built from; enough
+# to load when only the charts are needed.
+CHART_COLUMNS = [YEAR_COLUMN] + CATEGORICAL_COLUMNS + NUMERIC_COLUMNS
+
+
+def factorize(series):
+    """Sorted codes and labels of a column; categoricals with sorted categories are used as is."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.is_monotonic_increasing:
+        return series.cat.codes.to_numpy(), series.cat.categories
+    return pd.factorize(series, sort=True)
+
+
+class ColumnCodes:
+    """Factorized codes of one version of the clean dataset (-1 marks missing)."""
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.year_codes, self.years = pd.factorize(df[YEAR_COLUMN], sort=True)
+        self.codes = {}
+        self.labels = {}
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                self.codes[col], self.labels[col] = factorize(df[col])
+        self.numeric_columns = [col for col in NUMERIC_COLUMNS if col in df.columns]
+        self.numeric = df[self.numeric_columns].to_numpy(dtype=float, na_value=np.nan)
+
+
+def _count_pairs(outer_codes, outer_labels, inner_codes, inner_labels, names):
+    """Non-zero counts of (outer, inner) code pairs as a MultiIndex Series."""
+    valid = (outer_codes >= 0) & (inner_codes >= 0)
+    n_inner = len(inner_labels)
+    counts = np.bincount(
+        outer_codes[valid].astype(np.int64) * n_inner + inner_codes[valid],
+        minlength=len(outer_labels) * n_inner,
+    )
+    keys = np.flatnonzero(counts)
+    # The labels are already unique and sorted, so they serve as the levels as is.
+    index = pd.MultiIndex(
+        levels=[outer_labels, inner_labels], codes=[keys // n_inner, keys % n_inner],
+        names=names, verify_integrity=False,
+    )
+    return pd.Series(counts[keys], index=index)
+
+
+def _numeric_summary(codes, rows=None):
+    """Per-year count, mean and quantiles of every numeric column; columns are (column, statistic)."""
+    year_codes = codes.year_codes if rows is None else codes.year_codes[rows]
+    values = codes.numeric if rows is None else codes.numeric[rows]
+    numeric = pd.DataFrame(values, columns=codes.numeric_columns)
+    grouped = numeric.groupby(pd.Index(codes.years[year_codes], name=YEAR_COLUMN))
+    stats = {'count': grouped.count(), 'mean': grouped.mean()}
+    for name, q in QUANTILES.items():
+        stats[name] = grouped.quantile(q)
+    return pd.concat(stats, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+def _adjust(counts, added, removed):
+    """counts + added - removed, keeping only the non-zero entries."""
+    total = counts.add(added, fill_value=0).sub(removed, fill_value=0)
+    total = total[total > 0].astype(np.int64).sort_index()
+    if isinstance(total.index, pd.MultiIndex):
+        total.index = total.index.remove_unused_levels()
+    return total
+
+
+class AggregateCube:
+    """Materialized counts and summaries of the clean dataset, or of a subset of its rows."""
+
+    def __init__(self, codes, rows=None):
+        """Aggregate `codes` (a ColumnCodes), restricted to the row positions in `rows` if given."""
+        take = (lambda a: a) if rows is None else (lambda a: a[rows])
+        year_codes = take(codes.year_codes)
+        self.n_rows = len(year_codes)
+
+        year_counts = np.bincount(year_codes, minlength=len(codes.years))
+        present = np.flatnonzero(year_counts)
+        self.year_counts = pd.Series(
+            year_counts[present], index=pd.Index(codes.years[present], name=YEAR_COLUMN)
+        )
+
+        self.counts = {}
+        for col, col_codes in codes.codes.items():
+            self.counts[col] = _count_pairs(
+                year_codes, codes.years, take(col_codes), codes.labels[col], [YEAR_COLUMN, col]
+            )
+
+        self.pairs = {}
+        for parent, child in PAIR_COLUMNS:
+            if parent in codes.codes and child in codes.codes:
+                self.pairs[(parent, child)] = _count_pairs(
+                    take(codes.codes[parent]), codes.labels[parent],
+                    take(codes.codes[child]), codes.labels[child], [parent, child]
+                )
+
+        self.numeric = _numeric_summary(codes, rows)
+        self._digests = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(ColumnCodes(df))
+
+    def updated(self, codes, added, removed):
+        """
+        Cube of all the rows in `codes` (a ColumnCodes), given that this cube
+        covered the previous rows and `added` / `removed` are the cubes of the
+        rows that arrived and left since (a changed row is in both).
+        """
+        cube = object.__new__(AggregateCube)
+        cube.n_rows = codes.n_rows
+        cube.year_counts = _adjust(self.year_counts, added.year_counts, removed.year_counts)
+        cube.counts = {
+            col: _adjust(self.counts.get(col, pd.Series(dtype=np.int64)),
+                         added.counts.get(col, pd.Series(dtype=np.int64)),
+                         removed.counts.get(col, pd.Series(dtype=np.int64)))
+            for col in codes.codes
+        }
+        cube.pairs = {
+            pair: _adjust(counts, added.pairs.get(pair, pd.Series(dtype=np.int64)),
+                          removed.pairs.get(pair, pd.Series(dtype=np.int64)))
+            for pair, counts in self.pairs.items()
+        }
+        touched = added.year_counts.index.union(removed.year_counts.index)
+        touched_codes = np.flatnonzero(np.isin(codes.years, touched))
+        rows = np.flatnonzero(np.isin(codes.year_codes, touched_codes))
+        kept = self.numeric.drop(index=touched, errors='ignore')
+        cube.numeric = pd.concat([kept, _numeric_summary(codes, rows)]).sort_index()
+        cube._digests = {}
+        return cube
+
+    def _part(self, kind, key=None):
+        value = getattr(self, kind)
+        return value if key is None else value[key]
+
+    def digest(self, parts):
+        """
+        Fingerprint of the cube parts a chart reads, e.g. [('counts', 'Field'),
+        ('n_rows',)]; equal digests mean the chart would come out the same.
+        """
+        parts = tuple(parts)
+        if parts not in self._digests:
+            h = hashlib.sha256()
+            for part in parts:
+                value = self._part(*part)
+                h.update(repr(part).encode("utf-8"))
+                if isinstance(value, (pd.Series, pd.DataFrame)):
+                    h.update(repr(getattr(value, 'columns', None)).encode("utf-8"))
+                    h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+                else:
+                    h.update(repr(value).encode("utf-8"))
+            self._digests[parts] = h.hexdigest()
+        return self._digests[parts]
+
+    def category_counts(self, col):
+        """Counts per category over all years, largest first (like value_counts)."""
+        counts = self.counts[col].groupby(level=col).sum()
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def period_pivot(self, col):
+        """Period x category table of counts, as pivot_table(aggfunc='size') would give."""
+        counts = self.counts[col]
+        years = counts.index.get_level_values(YEAR_COLUMN)
+        period = np.where(years < normalize.PERIOD_SPLIT_YEAR, *normalize.PERIOD_LABELS)
+        pivot = counts.groupby([period, counts.index.get_level_values(col)]).sum().unstack(fill_value=0)
+        pivot.index.name = 'Period'
+        return pivot
+
+    def pair_counts(self, parent, child):
+        return self.pairs[(parent, child)]
+
+    def numeric_summary(self, col):
+        """Per-year count, mean, q1, median and q3 of a numeric column."""
+        return self.numeric[col]
+
+    def yearly_means(self, cols):
+        return pd.DataFrame({col: self.numeric[(col, 'mean')] for col in cols})
@@ -1,64 +1,118 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import plotly.express as px
-import base64
+import plotly.io as pio
 import os
 
+import aggregates
+import browser
+import charts
+import crosstab
+import dataset
+import exports
+import filters
+import refresh
+import search
+import telemetry
+import visitors
+
 # Must be the first Streamlit command:
 st.set_page_config(layout="wide")
 
 # -----------------------------------------------------------------------------
-# Helper Function: Store Visitor Registration Data
+# Visitor Store (SQLite, shared by all sessions in this process)
 # -----------------------------------------------------------------------------
-def store_visitor_data(data):
-    """
-    Append visitor data (dictionary) to a CSV file stored in the repository folder.
-    """
-    csv_file = "visitor_data.csv"  # This file is saved in the same folder as app.py
-    if os.path.exists(csv_file):
-        df_existing = pd.read_csv(csv_file)
-        df_existing = df_existing.append(data, ignore_index=True)
-        df_existing.to_csv(csv_file, index=False)
-    else:
-        df_new = pd.DataFrame([data])
-        df_new.to_csv(csv_file, index=False)
+@st.cache_resource
+def get_visitor_store():
+    return visitors.VisitorStore()
+
+visitor_store = get_visitor_store()
 
 # -----------------------------------------------------------------------------
 # Load Data (cached)
 # -----------------------------------------------------------------------------
-@st.cache_data
-def load_data():
-    # Use the raw URL to your CSV on GitHub.
-    url = "https://raw.githubusercontent.com/boonhowchew/malaysia-primary-care-research/main/REALQUAMI_Dataset_Merged.csv"
-    # Using on_bad_lines='skip' and the Python engine for more robust parsing.
-    df = pd.read_csv(url, on_bad_lines='skip', engine='python', encoding='utf-8')
-    # Ensure IDyear is numeric, drop rows with missing IDyear, and convert to int.
-    df = df.dropna(subset=['IDyear']).copy()
-    df['IDyear'] = pd.to_numeric(df['IDyear'], errors='coerce').astype(int)
-    return df
-
-df = load_data()
+# The dataset is read from a local Parquet snapshot of the repository CSV; GitHub
+# is only checked in the background (see dataset.py). The cache is keyed by the
+# content hash, so a new upstream version is picked up on the next rerun.
+# Every cached loader calls telemetry.miss(), so the spans around them can tell a
+# cache hit from a miss (the body only runs on a miss).
+#
+# Everything below is built once per dataset version and shared by every session
+# through st.cache_resource: one clean frame per process, not one copy per rerun
+# as st.cache_data would hand out. It is therefore read-only: sessions take
+# views (df.iloc[rows], which copy-on-write keeps from touching the original)
+# and never add or assign columns. Only the current and the previous version
+# are kept, so sessions still on the old one finish their rerun.
+VERSIONS_KEPT = 2
+
+# The clean frame, its factorized columns and the aggregate cube come from the
+# DatasetStore (see refresh.py): a new version is built from the previous one by
+# applying only the rows that were added, changed or removed. The raw frame is
+# not kept: label cleanup and the derived columns (see normalize.py) are applied
+# once, in this build step.
+@st.cache_resource
+def get_dataset_store():
+    return refresh.DatasetStore(keep=VERSIONS_KEPT)
+
+@st.cache_resource(max_entries=VERSIONS_KEPT)
+def load_dataset(version):
+    telemetry.miss()
+    return get_dataset_store().get(version)
+
+def load_clean_data(version):
+    return load_dataset(version).clean
+
+# Factorized columns, shared read-only by every session; the aggregate cube the
+# charts are drawn from and the filter index are both built from them.
+def load_codes(version):
+    return load_dataset(version).codes
+
+@st.cache_resource(max_entries=VERSIONS_KEPT)
+def load_filter_index(version):
+    telemetry.miss()
+    return filters.FilterIndex(load_codes(version))
+
+# Sort permutations for the paginated dataset browser.
+@st.cache_resource(max_entries=VERSIONS_KEPT)
+def load_sort_index(version):
+    telemetry.miss()
+    return browser.SortIndex(load_clean_data(version))
+
+# Inverted index for the search box, persisted to .cache/ per dataset version.
+@st.cache_resource(max_entries=VERSIONS_KEPT)
+def load_search_index(version):
+    telemetry.miss()
+    return search.load_index(version, load_clean_data(version))
+
+# Rows the strict CSV ingestion kept out of the dataset (see ingest.py).
+@st.cache_resource(max_entries=VERSIONS_KEPT)
+def load_quarantine(version):
+    telemetry.miss()
+    return dataset.load_quarantine(version)
+
+# Re-aggregation of the rows matching a filter; popular filters stay cached.
+@st.cache_resource(max_entries=64)
+def load_filtered_cube(version, filter_spec):
+    telemetry.miss()
+    rows = load_filter_index(version).select(filter_spec)
+    return aggregates.AggregateCube(load_codes(version), rows)
+
+dataset.start_revalidation()
+with telemetry.span("dataset.version"):
+    version = dataset.dataset_version()
+with telemetry.span("load", cached=True):
+    current = load_dataset(version)
+    df = current.clean
+    cube = current.cube
 
 # -----------------------------------------------------------------------------
-# Visitor Analytics: Update and Display Counts
+# Visitor Analytics: count every full page run
 # -----------------------------------------------------------------------------
-counter_file = "visitor_count.txt"
-try:
-    with open(counter_file, "r") as f:
-        total_visitors = int(f.read().strip())
-except:
-    total_visitors = 0
-total_visitors += 1
-with open(counter_file, "w") as f:
-    f.write(str(total_visitors))
-
-if os.path.exists("visitor_data.csv"):
-    registered_visitors = pd.read_csv("visitor_data.csv").shape[0]
-else:
-    registered_visitors = 0
+with telemetry.span("visitors.record_visit"):
+    visitor_store.record_visit()
+
+# The page is split into fragments (st.fragment): a widget inside one reruns only
+# that function, so registering, paging the browser, switching chart tabs or
+# picking a download format leaves the rest of the page alone. Only the sidebar
+# filters, which change what every section shows, rerun the whole script.
 
 # -----------------------------------------------------------------------------
 # Sidebar: Registration Form & Analytics
@@ -66,10 +120,18 @@ else:
 if "registered" not in st.session_state:
     st.session_state["registered"] = False
 
-st.sidebar.header("Visitor Registration")
-
-if not st.session_state["registered"]:
-    with st.sidebar.form("registration_form"):
+@st.fragment
+def registration_panel():
+    st.header("Visitor Registration")
+    if st.session_state["registered"]:
+        with telemetry.span("visitors.counts"):
+            total_visitors, registered_visitors = visitor_store.counts()
+        st.subheader("Visitor Analytics")
+        st.write("Total Visitors: ", total_visitors)
+        st.write("Registered Visitors: ", registered_visitors)
+        return
+
+    with st.form("registration_form"):
         first_name = st.text_input("First Name *")
         last_name = st.text_input("Last Name *")
         email = st.text_input("Email Address *")
@@ -82,7 +144,7 @@ if not st.session_state["registered"]:
         submitted = st.form_submit_button("Submit Registration")
     if submitted:
         if not (first_name and last_name and email and consent):
-            st.sidebar.error("Please fill in first name, last name, email and agree to the terms.")
+            st.error("Please fill in first name, last name, email and agree to the terms.")
         else:
             new_row = {
                 "First Name": first_name,
@@ -91,20 +153,43 @@ if not st.session_state["registered"]:
                 "Affiliation": affiliation,
                 "Purpose": purpose
             }
-            store_visitor_data(new_row)
+            with telemetry.span("visitors.add_registration"):
+                visitor_store.add_registration(new_row)
             st.session_state["registered"] = True
-            st.sidebar.success("Registration successful! Reloading page...")
-            st.experimental_rerun()
-else:
-    st.sidebar.subheader("Visitor Analytics")
-    st.sidebar.write("Total Visitors: ", total_visitors)
-    st.sidebar.write("Registered Visitors: ", registered_visitors)
+            st.success("Registration successful! Reloading page...")
+            # Registering unlocks links and downloads elsewhere on the page.
+            st.rerun(scope="app")
+
+with st.sidebar:
+    registration_panel()
+
+# -----------------------------------------------------------------------------
+# Sidebar: Filters (applied to every chart below)
+# -----------------------------------------------------------------------------
+filter_index = load_filter_index(version)
+st.sidebar.header("Filters")
+year_min, year_max = filter_index.year_bounds
+year_range = st.sidebar.slider("Publication Year", year_min, year_max, (year_min, year_max))
+selections = {}
+for col in filters.FILTER_COLUMNS:
+    if col in filter_index.labels:
+        selections[col] = st.sidebar.multiselect(filters.FILTER_LABELS[col], filter_index.options(col))
+
+filter_spec = filters.make_spec(year_range, selections)
+with telemetry.span("filter", cached=True):
+    view_rows = filter_index.select(filter_spec)
+    if view_rows is None:
+        view_cube = cube
+    else:
+        view_cube = load_filtered_cube(version, filter_spec)
 
 # -----------------------------------------------------------------------------
 # Main Page Content
 # -----------------------------------------------------------------------------
 st.title("Malaysian Primary Care Research Dashboard, 1962 to 2019")
 st.write("This dashboard updates automatically whenever the dataset on GitHub is updated.")
+if current.delta is not None:
+    st.caption(f"Latest dataset update: {current.delta} studies.")
 
 with st.expander("Project Synopsis"):
     st.markdown("""
@@ -166,8 +251,61 @@ st.markdown("### Flow Chart")
 st.image("Flow.png", caption="PRISMA Flow Chart", width=600)
 
 st.subheader("Dataset Overview")
-st.write(f"Total Publications: {len(df)}")
-st.dataframe(df.head(10))
+if view_rows is None:
+    st.write(f"Total Publications: {len(df)}")
+else:
+    st.write(f"Total Publications: {view_cube.n_rows} of {len(df)} (filtered)")
+
+# Curator report: records of the CSV that failed the ingestion checks.
+with telemetry.span("quarantine", cached=True):
+    quarantine = load_quarantine(version)
+if len(quarantine):
+    with st.expander(f"Data Quality Report: {len(quarantine)} records left out of the dataset"):
+        st.write(
+            "These records of the dataset CSV could not be loaded. Fix them in the CSV on GitHub "
+            "and they will be included on the next update."
+        )
+        st.dataframe(quarantine, hide_index=True)
+
+# Paginated browser: only the visible page of the chosen columns is sent.
+@st.fragment
+def dataset_browser():
+    sort_index = load_sort_index(version)
+    browse_cols = st.columns([3, 2, 1, 1])
+    with browse_cols[0]:
+        visible_columns = st.multiselect(
+            "Columns", list(df.columns), default=browser.DEFAULT_COLUMNS, key="browse_columns"
+        )
+    with browse_cols[1]:
+        sort_column = st.selectbox("Sort by", sort_index.columns, index=sort_index.columns.index('IDyear'), key="browse_sort")
+    with browse_cols[2]:
+        sort_ascending = st.radio("Order", ["Ascending", "Descending"], key="browse_order") == "Ascending"
+    with browse_cols[3]:
+        page_size = st.selectbox("Rows per page", browser.PAGE_SIZES, key="browse_page_size")
+
+    with telemetry.span("browse.order"):
+        browse_order = sort_index.order(sort_column, sort_ascending, rows=view_rows)
+    n_pages = browser.page_count(len(browse_order), page_size)
+    page_number = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, key="browse_page")
+    with telemetry.span("browse.page"):
+        page_df = browser.page(df, browse_order, page_number, page_size, visible_columns or browser.DEFAULT_COLUMNS)
+    st.dataframe(page_df, hide_index=True)
+
+@st.fragment
+def study_search():
+    query = st.text_input("Search studies by title, journal, corresponding author, institution or setting",
+                          key="search_query")
+    if query:
+        with telemetry.span("search", cached=True):
+            positions, scores = load_search_index(version).search(query, limit=50, rows=view_rows)
+        if len(positions) == 0:
+            st.write("No matching studies.")
+        else:
+            results = df.iloc[positions][search.RESULT_COLUMNS].assign(Score=scores.round(2))
+            st.dataframe(results, hide_index=True)
+
+dataset_browser()
+study_search()
 
 if st.session_state["registered"]:
     invitation_markdown = """
@@ -190,362 +328,193 @@ else:
     """
 st.markdown(invitation_markdown, unsafe_allow_html=True)
 
-df['Caspecialty'] = df['Caspecialty'].astype(str).str.strip()
-df['Caspecialty'] = df['Caspecialty'].replace({
-    'nan': 'Unknown', 'NaN': 'Unknown', '': 'Unknown', 'Not stated': 'Unknown'
-})
-df['Caspecialty'] = df['Caspecialty'].str.lower()
-df['Caspecialty'] = df['Caspecialty'].replace({
-    'family medicine': 'Family medicine',
-    'eye': 'Eye',
-    'unknown': 'Unknown'
-})
-counts = df['Caspecialty'].value_counts()
-counts = counts[counts > 0]
-cat_list = list(counts.index)
-if 'Unknown' in cat_list:
-    cat_list.remove('Unknown')
-    cat_list.append('Unknown')
-
-hierarchy_cols = ['JournalLoc', 'JournalScop']
-for col in hierarchy_cols:
-    df[col] = df[col].fillna("Unknown")
-    df[col] = df[col].replace(r'^\s*$', "Unknown", regex=True)
-    df[col] = df[col].str.strip().str.title()
-
-df['JournalLoc_short'] = df['JournalLoc'].apply(lambda x: x if len(x) <= 15 else x[:10] + "...")
-df['JournalScop_short'] = df['JournalScop'].apply(lambda x: x if len(x) <= 15 else x[:10] + "...")
-
-min_year = df['IDyear'].min()
-max_year = df['IDyear'].max()
-fig1, ax1 = plt.subplots(figsize=(6,4))
-sns.histplot(data=df, x='IDyear', bins=range(min_year, max_year+1), kde=False, ax=ax1)
-ax1.set_title("Annual Publication Trend (Histogram)")
-ax1.set_xlabel("Publication Year")
-ax1.set_ylabel("Number of Publications")
-plt.tight_layout()
-st.pyplot(fig1)
-
-fig2, ax2 = plt.subplots(figsize=(7,5))
-sns.countplot(y='Caspecialty', data=df, order=cat_list, ax=ax2)
-for p in ax2.patches:
-    width = p.get_width()
-    if width > 0:
-        ax2.annotate(f"{int(width)}", (width, p.get_y() + p.get_height()/2), ha='left', va='center')
-total_rows = len(df)
-ax2.set_title(f"Histogram of CA Specialty [Total: {total_rows}]")
-ax2.set_xlabel("Count of Studies")
-ax2.set_ylabel("CA Specialty")
-plt.tight_layout()
-st.pyplot(fig2)
-
-
-df_line = df.groupby('IDyear')[['AuthorNum', 'InstitNum', 'AuthorOvNum', 'InstitOvNum']].mean().reset_index()
-
-fig3, ax3 = plt.subplots(figsize=(7,4))
-for col in ['AuthorNum', 'InstitNum', 'AuthorOvNum', 'InstitOvNum']:
-    sns.lineplot(data=df_line, x='IDyear', y=col, marker='o', label=col, ax=ax3)
-
-ax3.set_title("Mean Authors, Institutions, etc. per Paper by Year")
-ax3.set_xlabel("Publication Year")
-ax3.set_ylabel("Mean Count per Paper")
-ax3.legend()
-plt.tight_layout()
-st.pyplot(fig3)
-
 # -----------------------------------------------------------------------------
-# 4. Smoothed Line Chart: Median ± IQR of AuthorNum by Year
+# Charts (see charts.py), served from a process-wide cache of rendered images
+# and serialized Plotly figures, keyed by the cube parts each chart is drawn
+# from (charts.input_digest): a dataset update or a filter that leaves a chart's
+# inputs unchanged reuses the chart already rendered
 # -----------------------------------------------------------------------------
-# Instead of sum, use median for a more robust metric
-# Group by year and compute median, Q1, and Q3 for AuthorNum
-agg_author = df.groupby('IDyear')['AuthorNum'].agg(
-    median='median',
-    q1=lambda x: x.quantile(0.25),
-    q3=lambda x: x.quantile(0.75),
-    count='count'
-).reset_index()
-
-years = agg_author['IDyear']
-median_values = agg_author['median']
-q1_values = agg_author['q1']
-q3_values = agg_author['q3']
-
-fig4, ax4 = plt.subplots(figsize=(7,4))
-ax4.plot(years, median_values, marker='o', color='steelblue', label='Median AuthorNum')
-ax4.fill_between(years, q1_values, q3_values, color='steelblue', alpha=0.2, label='IQR (25%–75%)')
-ax4.set_title("Median ± IQR of AuthorNum by Year")
-ax4.set_xlabel("Publication Year")
-ax4.set_ylabel("Number of Authors per Paper")
-ax4.legend()
-plt.tight_layout()
-
-# Render the new chart in Streamlit
-st.pyplot(fig4)
-
-fig5 = px.sunburst(
-    df,
-    path=['JournalLoc_short', 'JournalScop_short'],
-    title="Multilayer Pie Chart: Journal Locality and Scope",
-    custom_data=['JournalLoc', 'JournalScop']
-)
-fig5.update_traces(
-    hovertemplate='<b>Journal Loc:</b> %{customdata[0]}<br><b>Journal Scope:</b> %{customdata[1]}<br>Count: %{value}<extra></extra>',
-    textinfo="label+percent entry"
-)
-# Enlarge the sunburst chart:
-fig5.update_layout(width=800, height=650)  # Adjust dimensions as needed
-st.plotly_chart(fig5)
-
-st.markdown("### Additional Overview of Research Characteristics")
-# -------------------------
-# 1. Load Data
-# -------------------------
-@st.cache_data
-def load_data():
-    # Use the raw URL to your CSV on GitHub (ensure it points to your cleaned dataset)
-    url = "https://raw.githubusercontent.com/boonhowchew/malaysia-primary-care-research/main/REALQUAMI_Dataset_Merged.csv"
-    df = pd.read_csv(url, on_bad_lines='skip', engine='python', encoding='utf-8')
-    df['IDyear'] = pd.to_numeric(df['IDyear'], errors='coerce')
-    return df
-
-df = load_data()
-
-# -------------------------
-# 2. Merge Redundant Labels
-# -------------------------
-# For the 'Class' column
-if "Class" in df.columns:
-    df['Class'] = df['Class'].astype(str).str.strip().replace({
-        'mixed': 'Mixed',
-        'others': 'Others',
-        'qualitative': 'Qualitative (include case reports)',
-        'Qualitative (include case reports here)': 'Qualitative (include case reports)',
-        'quantitative': 'Quantitative (include case series)'
-    })
-
-# For the 'Level' column
-if "Level" in df.columns:
-    df['Level'] = df['Level'].astype(str).str.strip().replace({
-        'primary (include case reports)': 'Primary (include case reports, case series)',
-        'Primary (include case reports)': 'Primary (include case reports, case series)'
-    })
-
-# For the 'CatQuanti' column
-if "CatQuanti" in df.columns:
-    df['CatQuanti'] = df['CatQuanti'].astype(str).str.strip().replace({
-        'prevalence': 'Prevalence',
-        'etiologic': 'Etiologic'
-    })
-
-# For the 'DataCollect' column
-if "DataCollect" in df.columns:
-    df['DataCollect'] = df['DataCollect'].astype(str).str.strip().replace({
-        'cross-section': 'Cross-sectional',
-        'cross-sectional': 'Cross-sectional'
-    })
-
-# -------------------------
-# 3. Create "Period" Column
-# -------------------------
-df['Period'] = df['IDyear'].apply(lambda x: 'Early (1962-1999)' if x < 2000 else 'Recent (2000-2019)')
-
-# -------------------------
-# 4. Create Pivot Tables by Period for six variables
-# -------------------------
-def pivot_by_period(dataframe, col_name):
-    """Creates a pivot table with Period as index and the specified column's categories as columns."""
-    return dataframe.pivot_table(index='Period', columns=col_name, aggfunc='size', fill_value=0)
-
-pivot_article = pivot_by_period(df, 'Article')
-pivot_field   = pivot_by_period(df, 'Field')
-pivot_class   = pivot_by_period(df, 'Class')
-pivot_level   = pivot_by_period(df, 'Level')
-pivot_quanti  = pivot_by_period(df, 'CatQuanti')
-pivot_datac   = pivot_by_period(df, 'DataCollect')
-
-pivots = [
-    ("Article Type Distribution", pivot_article),
-    ("Field of Study Distribution", pivot_field),
-    ("Study Design (Class) Distribution", pivot_class),
-    ("Level of Study Distribution", pivot_level),
-    ("Quant Study Types Distribution", pivot_quanti),
-    ("Data Collection Methods Distribution", pivot_datac),
-]
-
-# -------------------------
-# 5. Plot the Six Stacked Bar Charts
-# -------------------------
-fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(14, 18))
-axes = axes.flatten()
-
-for ax, (title, pivot_df) in zip(axes, pivots):
-    # Order columns so that subvariables are in descending order by overall count (largest at bottom)
-    ordered_cols = pivot_df.sum(axis=0).sort_values(ascending=False).index.tolist()
-    pivot_ordered = pivot_df[ordered_cols]
-    
-    # Compute total counts for each subvariable and create a rename mapping (e.g., "Case reports" -> "Case reports (45)")
-    col_sums = pivot_ordered.sum(axis=0)
-    rename_map = {col: f"{col} ({int(col_sums[col])})" for col in pivot_ordered.columns}
-    pivot_renamed = pivot_ordered.rename(columns=rename_map)
-    
-    # Calculate the total count for the chart (sum of all cells in the pivot table)
-    chart_total = pivot_df.values.sum()
-    
-    # Plot the stacked bar chart using the renamed pivot table
-    pivot_renamed.plot(kind='bar', stacked=True, ax=ax, colormap='tab20')
-    ax.set_title(f"{title}\n(Total: {int(chart_total)})", fontsize=11)
-    ax.set_xlabel("Period")
-    ax.set_ylabel("Number of Studies")
-    # Place legend in the top-left corner
-    ax.legend(loc='upper left', fontsize=8)
-    # Set x-axis tick labels horizontally
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=0)
-
-plt.tight_layout()
-st.pyplot(fig)
+@st.cache_resource
+def get_figure_cache():
+    return charts.FigureCache()
 
-# -----------------------------------------------------------------------------
-# 7. MIRROR BAR CHART: Condition_primary vs Condition_secondary
-# -----------------------------------------------------------------------------
+figure_cache = get_figure_cache()
 
-# 1. Get frequencies for Condition_primary (descending) and Condition_secondary (descending)
-cond1_counts = df["Condition_primary"].value_counts().sort_values(ascending=False)
-cond2_counts = df["Condition_secondary"].value_counts().sort_values(ascending=False)
-
-# 2. Create a combined index that ensures:
-#    - All categories from Condition_primary in descending order
-#    - Then any extra categories from Condition_secondary appended below
-cond1_index = cond1_counts.index
-cond2_index = cond2_counts.index
-
-extra_cats = cond2_index.difference(cond1_index)  # categories in secondary, not in primary
-extra_cats_sorted = cond2_counts.loc[extra_cats].sort_values(ascending=False).index
-final_index = cond1_index.append(extra_cats_sorted)
-
-# 3. Reindex both counts so they share exactly the same index
-cond1_aligned = cond1_counts.reindex(final_index, fill_value=0)
-cond2_aligned = cond2_counts.reindex(final_index, fill_value=0)
-
-# 4. Convert Condition_secondary to negative for mirroring
-cond2_neg = -cond2_aligned
-
-# 5. Create subplots with sharey=True so subvariable names align
-fig_mirror, axes_mirror = plt.subplots(nrows=1, ncols=2, figsize=(14, 8), sharey=True)
-
-# --- LEFT CHART: Condition_primary ---
-axes_mirror[0].barh(cond1_aligned.index, cond1_aligned.values, color="skyblue", zorder=2)
-axes_mirror[0].set_title(f"Condition_primary (n={cond1_counts.sum()})", fontsize=12)
-axes_mirror[0].set_xlabel("Count")
-axes_mirror[0].invert_yaxis()  # largest category at top
-
-# Annotate each bar
-for patch in axes_mirror[0].patches:
-    width = patch.get_width()
-    y_center = patch.get_y() + patch.get_height()/2
-    axes_mirror[0].annotate(
-        f"{int(width)}",
-        (width, y_center),
-        xytext=(5, 0),
-        textcoords="offset points",
-        va="center", ha="left", fontsize=9
-    )
+def render_chart(name, fmt, dpi):
+    telemetry.miss()
+    return charts.render(name, view_cube, fmt, dpi)
 
-# --- RIGHT CHART: Condition_secondary (mirrored) ---
-axes_mirror[1].barh(cond2_neg.index, cond2_neg.values, color="salmon", zorder=2)
-axes_mirror[1].set_title(f"Condition_secondary (n={cond2_counts.sum()})", fontsize=12)
-axes_mirror[1].set_xlabel("Count")
-axes_mirror[1].invert_yaxis()  # largest category at top
-axes_mirror[1].yaxis.tick_right()
-axes_mirror[1].yaxis.set_label_position("right")
-
-# Annotate each bar (negative) with absolute count
-for patch in axes_mirror[1].patches:
-    width = patch.get_width()  # negative
-    y_center = patch.get_y() + patch.get_height()/2
-    axes_mirror[1].annotate(
-        f"{int(abs(width))}",
-        (width, y_center),
-        xytext=(-5, 0),
-        textcoords="offset points",
-        va="center", ha="right", fontsize=9
-    )
+def chart_image(name, fmt='png', dpi=charts.DISPLAY_DPI):
+    """Rendered bytes of a chart for the current filters, shared by every session."""
+    with telemetry.span(f"chart.{name}", cached=True):
+        return figure_cache.get_or_create(
+            (charts.input_digest(name, view_cube), name, fmt, dpi), lambda: render_chart(name, fmt, dpi)
+        )
 
-# OPTIONAL: Dotted lines every 3rd category
-for i in range(0, len(final_index), 3):
-    axes_mirror[0].axhline(i - 0.5, color="grey", linestyle="--", alpha=0.6, zorder=1)
-    axes_mirror[1].axhline(i - 0.5, color="grey", linestyle="--", alpha=0.6, zorder=1)
+def serialize_chart(name):
+    telemetry.miss()
+    return charts.figure_json(name, view_cube)
 
-# Align x-limits for a consistent mirrored look
-max_left = cond1_aligned.max()
-max_right = cond2_aligned.max()
-axes_mirror[0].set_xlim(0, max_left * 1.1)
-axes_mirror[1].set_xlim(-max_right * 1.1, 0)
+def chart_json(name):
+    """Plotly JSON of a chart for the current filters, built from the cube."""
+    with telemetry.span(f"chart.{name}", cached=True, fmt='plotly'):
+        return figure_cache.get_or_create(
+            (charts.input_digest(name, view_cube), name, 'plotly'), lambda: serialize_chart(name)
+        )
 
-plt.tight_layout()
+def show_chart(name):
+    """The interactive Plotly version if switched on, the image otherwise."""
+    if st.session_state.get("interactive_charts") or name not in charts.CHARTS:
+        st.plotly_chart(pio.from_json(chart_json(name)))
+    else:
+        st.image(chart_image(name), width="stretch")
+
+def author_charts():
+    show_chart('mean_counts')
+    show_chart('author_iqr')
+
+def period_charts():
+    st.markdown("### Additional Overview of Research Characteristics")
+    show_chart('period_bars')
+
+def condition_chart():
+    st.markdown("### Mirror Bar Chart: Condition Primary vs Condition Secondary")
+    show_chart('condition_mirror')
+
+# (tab label, function drawing the tab)
+CHART_TABS = [
+    ("Publication Trend", lambda: show_chart('publication_trend')),
+    ("CA Specialty", lambda: show_chart('caspecialty')),
+    ("Authors & Institutions", author_charts),
+    ("Journals", lambda: show_chart('journal_sunburst')),
+    ("Research Characteristics", period_charts),
+    ("Conditions", condition_chart),
+]
 
-# 6. Render in Streamlit
-st.markdown("### Mirror Bar Chart: Condition Primary vs Condition Secondary")
-st.pyplot(fig_mirror)
+# Only the open tab is drawn (on_change="rerun" makes tab.open known), and
+# switching tabs reruns just this fragment.
+@st.fragment
+def chart_tabs():
+    if view_cube.n_rows == 0:
+        st.warning("No publications match the selected filters.")
+        return
+    st.toggle("Interactive charts", key="interactive_charts")
+    tabs = st.tabs([label for label, _ in CHART_TABS], on_change="rerun", key="chart_tab")
+    for tab, (_, draw) in zip(tabs, CHART_TABS):
+        if tab.open:
+            with tab:
+                draw()
 
+chart_tabs()
 
-folder_path = "charts"
-if not os.path.exists(folder_path):
-    os.makedirs(folder_path)
 
-fig1.savefig(f"{folder_path}/Annual_Publication_Trend_Histogram.png", dpi=300, bbox_inches='tight')
-fig2.savefig(f"{folder_path}/Caspecialty_Histogram.png", dpi=300, bbox_inches='tight')
-fig3.savefig(f"{folder_path}/LineGraph_TotalCounts.png", dpi=300, bbox_inches='tight')
-# If Kaleido is installed, you can also save the Plotly chart:
-# fig5.write_image(f"{folder_path}/Journal_Locality_and_Scope_SunburstChart.png", scale=2)
+# -----------------------------------------------------------------------------
+# Cross-tab Explorer: any two categorical columns, by time bin (see crosstab.py)
+# -----------------------------------------------------------------------------
+# Computed from the factorized codes of the rows matching the filters; the most
+# recently used tables stay cached for every session.
+@st.cache_resource(max_entries=128)
+def load_crosstab(version, filter_spec, row_col, col_col, binning):
+    telemetry.miss()
+    rows = load_filter_index(version).select(filter_spec)
+    return crosstab.cross_tab(load_codes(version), row_col, col_col, binning, rows)
+
+def format_chi_square(statistic, dof, p_value):
+    if statistic is None:
+        return "Chi-square: not defined (needs at least two rows and two columns with counts)"
+    text = f"Chi-square = {statistic:.2f}, df = {dof}"
+    return text + (f", p = {p_value:.3g}" if p_value is not None else "")
+
+@st.fragment
+def crosstab_explorer():
+    st.markdown("### Cross-tab Explorer")
+    columns = [col for col in aggregates.CATEGORICAL_COLUMNS if col in load_codes(version).codes]
+    left, middle, right = st.columns(3)
+    row_col = left.selectbox("Rows", columns, index=columns.index('Setting'), key="crosstab_rows")
+    col_col = middle.selectbox("Columns", columns, index=columns.index('Class'), key="crosstab_columns")
+    binning = right.selectbox("Time binning", list(crosstab.BINNINGS), key="crosstab_binning")
+    if row_col == col_col:
+        st.info("Pick two different columns.")
+        return
+    with telemetry.span("crosstab", cached=True):
+        result = load_crosstab(version, filter_spec, row_col, col_col, binning)
+    if result.n_rows == 0:
+        st.warning("No publications with both labels match the selected filters.")
+        return
+    values = st.radio("Show", ["Counts", "Row %"], horizontal=True, key="crosstab_values")
+    st.dataframe(result.counts if values == "Counts" else result.row_percent)
+    st.write(f"{format_chi_square(*result.chi_square)} (n = {result.n_rows})")
+    if result.chi_square_by_bin is not None:
+        st.dataframe(result.chi_square_by_bin, hide_index=True)
+    if not crosstab.HAVE_SCIPY:
+        st.caption("Install scipy to see p-values.")
+
+crosstab_explorer()
 
-df.to_csv(f"{folder_path}/REALQUAMI_Dataset_Cleansed.csv", index=False)
 
-if st.session_state["registered"]:
-    st.markdown("## Download Files")
-    with open(f"{folder_path}/Annual_Publication_Trend_Histogram.png", "rb") as file_chart:
-        st.download_button(
-            label="Download Annual Publication Trend Histogram",
-            data=file_chart,
-            file_name="Annual_Publication_Trend_Histogram.png",
-            mime="image/png"
-        )
-    with open(f"{folder_path}/Caspecialty_Histogram.png", "rb") as file_chart:
-        st.download_button(
-            label="Download CA Specialty Histogram",
-            data=file_chart,
-            file_name="Caspecialty_Histogram.png",
-            mime="image/png"
-        )
-    with open(f"{folder_path}/LineGraph_TotalCounts.png", "rb") as file_chart:
-        st.download_button(
-            label="Download Line Graph Total Counts",
-            data=file_chart,
-            file_name="LineGraph_TotalCounts.png",
-            mime="image/png"
-        )
-        
 # -----------------------------------------------------------------------------
-# Additional Chart: Mirror Bar Chart (Condition_primary vs Condition_secondary)
+# Downloads: charts/ is rebuilt in the background when the dataset changes
 # -----------------------------------------------------------------------------
-# (Your mirror bar chart code is already executed and displayed via st.pyplot(fig_mirror) above)
-
-# Now, save the mirror bar chart to the same folder ("charts") as your other charts
-folder_path = "charts"  # This folder is already used for saving other charts
-if not os.path.exists(folder_path):
-    os.makedirs(folder_path)
+@st.cache_resource
+def get_export_job():
+    return exports.ExportJob()
+
+export_job = get_export_job()
+with telemetry.span("export.ensure"):
+    export_job.ensure(version, df, cube)
+
+DOWNLOAD_LABELS = {
+    "Annual_Publication_Trend_Histogram.png": "Download Annual Publication Trend Histogram",
+    "Caspecialty_Histogram.png": "Download CA Specialty Histogram",
+    "LineGraph_TotalCounts.png": "Download Line Graph Total Counts",
+    "Mirror_Bar_Chart_Condition.png": "Download Mirror Bar Chart (Condition)",
+}
+
+@st.fragment
+def downloads():
+    st.markdown("## Download Files")
+    if not export_job.is_current(version):
+        st.caption("Download files are being updated to the latest dataset version.")
+    for file_name, label in DOWNLOAD_LABELS.items():
+        path = exports.export_path(file_name)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as file_chart:
+            st.download_button(
+                label=label,
+                data=file_chart,
+                file_name=file_name,
+                mime="image/png"
+            )
+
+    # Rows matching the current filters, written in chunks on first request and
+    # reused for identical filter + format requests.
+    st.markdown("## Download Filtered Data")
+    st.write(f"{view_cube.n_rows} publications match the current filters.")
+    subset_format = st.radio("Format", list(exports.SUBSET_FORMATS), horizontal=True, key="subset_format")
+    extension, mime = exports.SUBSET_FORMATS[subset_format]
+
+    def read_subset():
+        with telemetry.span("export.subset", cached=True, fmt=subset_format):
+            with open(exports.export_subset(version, filter_spec, df, view_rows, subset_format,
+                                            keep_versions=VERSIONS_KEPT), "rb") as f:
+                return f.read()
+
+    st.download_button(
+        label=f"Download Filtered Dataset ({subset_format})",
+        data=read_subset,
+        file_name=f"REALQUAMI_Dataset_Filtered.{extension}",
+        mime=mime
+    )
 
-# Save the mirror bar chart (replace 'fig_mirror' with the correct variable name if different)
-fig_mirror.savefig(f"{folder_path}/Mirror_Bar_Chart_Condition.png", dpi=300, bbox_inches='tight')
+if st.session_state["registered"]:
+    downloads()
 
 # -----------------------------------------------------------------------------
-# Provide Download Button for the Mirror Bar Chart (only if registered)
+# Admin: stage timings, shown only with ?admin=<REALQUAMI_ADMIN_TOKEN> in the URL
 # -----------------------------------------------------------------------------
-if st.session_state["registered"]:
-    st.markdown("## Download Additional Charts")
-    with open(f"{folder_path}/Mirror_Bar_Chart_Condition.png", "rb") as file_chart:
-        st.download_button(
-            label="Download Mirror Bar Chart (Condition)",
-            data=file_chart,
-            file_name="Mirror_Bar_Chart_Condition.png",
-            mime="image/png"
-        )
+admin_token = os.environ.get("REALQUAMI_ADMIN_TOKEN")
+if admin_token and st.query_params.get("admin") == admin_token:
+    with st.sidebar.expander("Performance"):
+        st.caption(f"Last {telemetry.WINDOW} spans per stage, all sessions of this process. Log: {telemetry.LOG_FILE}")
+        st.dataframe(telemetry.summary(), hide_index=True)
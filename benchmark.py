@@ -0,0 +1,231 @@
+"""
+Benchmark the dashboard pipeline on synthetic data of any size.
+
+    python benchmark.py                              # 1k, 10k and 100k rows
+    python benchmark.py --rows 1000 1000000 --output bench.json
+    python benchmark.py --compare bench-before.json
+
+synthesize() builds a frame with the columns of REALQUAMI_Dataset_Merged.csv by
+sampling every column from its distribution in the real dataset (missing rate
+included), so categorical columns keep their real, small cardinalities. The
+identifier-like text columns in SCALED_COLUMNS grow with the row count at the
+rate seen in the real data, as a larger literature review would.
+
+Each stage of the pipeline (ingest, snapshot, normalize, aggregate, every chart,
+export) is timed on its own, best of --repeat runs, and then run once more under
+tracemalloc for its peak allocation. Results are written as JSON together with
+the commit and library versions, and --compare prints the change against an
+earlier results file.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import charts
+import dataset
+import exports
+from aggregates import AggregateCube, ColumnCodes
+from normalize import normalize
+
+DEFAULT_ROWS = [1_000, 10_000, 100_000]
+
+# Free-text columns whose number of distinct values grows with the dataset.
+SCALED_COLUMNS = [
+    'IDname', 'Title', 'CAname', 'CAinst1', 'CAinst2', 'JournalName(fullname)', 'StudySitesNum',
+]
+
+
+# -----------------------------------------------------------------------------
+# Synthetic data
+# -----------------------------------------------------------------------------
+def synthesize(n_rows, template, seed=0):
+    """A frame of n_rows rows with the columns and value distributions of `template`."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for col in template.columns:
+        if col == 'UniqueID':
+            columns[col] = np.arange(n_rows)
+            continue
+        values = template[col]
+        missing = rng.random(n_rows) < values.isna().mean()
+        counts = values.value_counts()
+        uniques = counts.index.to_numpy()
+        if col in SCALED_COLUMNS and len(uniques):
+            # A pool of distinct values as large as the real ratio implies,
+            # made by numbering repeats of the real values.
+            pool_size = max(len(uniques), round(n_rows * len(uniques) / len(values)))
+            picks = rng.integers(pool_size, size=n_rows)
+            base = pd.Series(uniques[picks % len(uniques)], dtype=object)
+            repeat = pd.Series(picks // len(uniques))
+            sampled = base.where(repeat == 0, base + " " + repeat.astype(str))
+        elif len(uniques):
+            sampled = pd.Series(rng.choice(uniques, size=n_rows, p=(counts / counts.sum()).to_numpy()))
+        else:
+            sampled = pd.Series([np.nan] * n_rows)
+        columns[col] = sampled.mask(missing).to_numpy()
+    return pd.DataFrame(columns, columns=template.columns)
+
+
+# -----------------------------------------------------------------------------
+# Measuring
+# -----------------------------------------------------------------------------
+def measure(fn, repeat):
+    """Best wall time of `repeat` runs, then the peak traced allocation of one more."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {'seconds': round(best, 6), 'peak_bytes': peak}
+
+
+def max_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_pipeline(raw, repeat, scratch, skip=()):
+    """Time every pipeline stage on one synthetic frame, except those named in `skip`."""
+    stages = {}
+
+    def stage(name, fn):
+        if name in skip:
+            return None
+        result, stages[name] = measure(fn, repeat)
+        return result
+
+    csv_bytes = raw.to_csv(index=False).encode("utf-8")
+    df, _ = stage('ingest_csv', lambda: dataset.parse_csv(csv_bytes))
+
+    def write_parquet():
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+    snapshot = stage('snapshot_write', write_parquet)
+    stage('snapshot_read', lambda: pd.read_parquet(io.BytesIO(snapshot)))
+
+    clean = stage('normalize', lambda: normalize(df))
+    codes = stage('factorize', lambda: ColumnCodes(clean))
+    cube = stage('aggregate', lambda: AggregateCube(codes))
+    rows = np.flatnonzero(clean['IDyear'].to_numpy() >= 2000)
+    stage('aggregate_subset', lambda: AggregateCube(codes, rows))
+
+    for name in charts.CHARTS:
+        stage(f'chart_{name}', lambda name=name: charts.render(name, cube, 'png', charts.DISPLAY_DPI))
+    for name in charts.PLOTLY_CHARTS:
+        stage(f'plotly_{name}', lambda name=name: charts.figure_json(name, cube))
+
+    def export(fmt):
+        path = os.path.join(scratch, f"subset.{exports.SUBSET_FORMATS[fmt][0]}")
+        with open(path, "wb") as f:
+            exports.SUBSET_WRITERS[fmt](clean, None, f)
+
+    stage('export_cleansed_csv', lambda: clean.to_csv(index=False).encode("utf-8"))
+    for fmt in exports.SUBSET_FORMATS:
+        stage(f'export_{fmt.lower()}', lambda fmt=fmt: export(fmt))
+    return stages
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=dataset.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def compare(results, baseline):
+    """Print the time and memory ratio of every stage against a baseline run."""
+    old = {run['rows']: run['stages'] for run in baseline['runs']}
+    print(f"\nCompared with {baseline['environment'].get('commit')}:")
+    for run in results['runs']:
+        if run['rows'] not in old:
+            continue
+        print(f"  {run['rows']:>9,} rows")
+        for name, new in run['stages'].items():
+            before = old[run['rows']].get(name)
+            if not before:
+                continue
+            time_ratio = new['seconds'] / before['seconds'] if before['seconds'] else float('nan')
+            mem_ratio = new['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else float('nan')
+            print(f"    {name:<28} time x{time_ratio:5.2f}   memory x{mem_ratio:5.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard pipeline on synthetic data.")
+    parser.add_argument("--rows", nargs="+", type=int, default=DEFAULT_ROWS,
+                        help="dataset sizes to benchmark (default: 1000 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per stage; the best is kept (default: 3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", nargs="+", default=[], metavar="STAGE",
+                        help="chart_*, plotly_* or export_* stages to leave out, e.g. export_xlsx (slow on large datasets)")
+    parser.add_argument("--output", help="results file (default: benchmark-<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results file to compare with")
+    args = parser.parse_args(argv)
+    # Later stages need the output of the earlier ones, so only charts and exports can be skipped.
+    for name in args.skip:
+        if not name.startswith(('chart_', 'plotly_', 'export_')):
+            parser.error(f"cannot skip {name}: only chart_*, plotly_* and export_* stages can be skipped")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    template = dataset.load_data()
+    results = {'environment': environment(), 'runs': []}
+
+    with tempfile.TemporaryDirectory() as scratch:
+        for n_rows in args.rows:
+            raw = synthesize(n_rows, template, args.seed)
+            print(f"{n_rows:,} rows")
+            stages = run_pipeline(raw, args.repeat, scratch, set(args.skip))
+            for name, stats in stages.items():
+                print(f"  {name:<28} {stats['seconds'] * 1000:10.1f} ms {stats['peak_bytes'] / 2**20:9.1f} MiB")
+            results['runs'].append({'rows': n_rows, 'stages': stages})
+    results['environment']['max_rss_bytes'] = max_rss_bytes()
+
+    output = args.output or f"benchmark-{results['environment']['commit'] or 'local'}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
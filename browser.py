@@ -0,0 +1,57 @@
+"""
+Paginated dataset browser.
+
+SortIndex precomputes, once per dataset version, the ascending and descending
+row order of every sortable column (missing values last in both directions).
+A page is then a slice of one of those permutations, restricted to the rows of
+the current filter, projected onto the chosen columns, so only the visible
+page is sent to the browser whatever the size of the dataset.
+"""
+import numpy as np
+
+from aggregates import factorize
+
+SORTABLE_COLUMNS = [
+    'UniqueID', 'IDyear', 'IDname', 'Title', 'CAname', 'Caspecialty', 'AuthorNum',
+    'InstitNum', 'JournalName(fullname)', 'JournalLoc', 'JournalScop', 'Article',
+    'Field', 'Level', 'Class', 'Setting', 'Condition_primary',
+]
+DEFAULT_COLUMNS = [
+    'IDyear', 'IDname', 'Title', 'Caspecialty', 'JournalName(fullname)', 'Field', 'Class',
+]
+PAGE_SIZES = [10, 25, 50, 100]
+
+
+class SortIndex:
+    """Ascending and descending row permutations for every sortable column."""
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.columns = [col for col in SORTABLE_COLUMNS if col in df.columns]
+        self.orders = {}
+        for col in self.columns:
+            codes, _ = factorize(df[col])
+            missing = codes < 0
+            ascending = np.where(missing, np.iinfo(codes.dtype).max, codes)
+            descending = np.where(missing, np.iinfo(codes.dtype).max, -codes)
+            self.orders[(col, True)] = np.argsort(ascending, kind='stable')
+            self.orders[(col, False)] = np.argsort(descending, kind='stable')
+
+    def order(self, col, ascending=True, rows=None):
+        """Row positions sorted by `col`, keeping only `rows` if given."""
+        order = self.orders[(col, ascending)]
+        if rows is None:
+            return order
+        allowed = np.zeros(self.n_rows, dtype=bool)
+        allowed[rows] = True
+        return order[allowed[order]]
+
+
+def page(df, order, page_number, page_size, columns):
+    """One page (1-based) of `df` in the given row order, with only `columns`."""
+    start = (page_number - 1) * page_size
+    return df.iloc[order[start:start + page_size], df.columns.get_indexer(columns)]
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
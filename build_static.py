@@ -0,0 +1,232 @@
+"""
+Build the read-only part of the dashboard as a static site.
+
+    python build_static.py                           # into site/, if the dataset changed
+    python build_static.py --output /srv/www/realquami --app-url https://realquami.streamlit.app
+    python build_static.py --force
+
+Every viewer of app.py costs a script run, although the charts and summaries
+only change with the dataset. This writes them once, as files any web server
+(or GitHub Pages) can serve:
+
+    index.html       the page; Plotly.js from the CDN draws the charts client-side
+    figures.json     every chart of charts.PLOTLY_CHARTS, built from the cube
+    aggregates.json  study counts per year and per category of every column
+    studies.json     STUDY_COLUMNS of every study, categorical columns as
+                     label lists plus codes
+    studies.parquet  the same slice, for analysis tools
+
+The page links to the Streamlit app (--app-url) for registration, filters and
+downloads. A manifest in the output folder records the dataset version and the
+source of the code the site was built from; the build is skipped when neither
+changed (or redone anyway with --force).
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+import plotly.offline
+
+import browser
+import charts
+import dataset
+import telemetry
+from aggregates import AggregateCube, ColumnCodes
+from dataset import BASE_DIR, atomic_write
+from normalize import normalize
+from render_charts import CODE_MODULES, code_version
+
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "site")
+MANIFEST_NAME = ".build-manifest.json"
+STUDY_COLUMNS = ['UniqueID'] + browser.DEFAULT_COLUMNS
+
+# (section title, charts shown in it), in the order of the dashboard tabs
+SECTIONS = [
+    ("Publication Trend", ['publication_trend']),
+    ("CA Specialty", ['caspecialty']),
+    ("Authors & Institutions", ['mean_counts', 'author_iqr']),
+    ("Journals", ['journal_sunburst']),
+    ("Research Characteristics", ['period_bars']),
+    ("Conditions", ['condition_mirror']),
+]
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Malaysian Primary Care Research Dashboard</title>
+<script src="https://cdn.plot.ly/plotly-__PLOTLYJS_VERSION__.min.js" charset="utf-8"></script>
+<style>
+  body { font-family: sans-serif; margin: 0 auto; max-width: 1200px; padding: 1rem 2rem; color: #262730; }
+  nav a { margin-right: 1rem; }
+  .chart { margin-bottom: 2rem; }
+  table { border-collapse: collapse; width: 100%; font-size: 0.9rem; }
+  th, td { border-bottom: 1px solid #ddd; padding: 0.3rem; text-align: left; vertical-align: top; }
+  input { padding: 0.4rem; width: 20rem; }
+  .note { color: #666; font-size: 0.85rem; }
+</style>
+</head>
+<body>
+<h1>Malaysian Primary Care Research Dashboard, 1962 to 2019</h1>
+<p>Total Publications: <strong id="total"></strong>
+   <span class="note">(dataset version __VERSION__, built __BUILT__)</span></p>
+<p>__APP_LINK__</p>
+<nav>__NAV__</nav>
+__SECTIONS__
+<h2 id="studies">Studies</h2>
+<p><input id="search" type="search" placeholder="Search titles, authors and journals">
+   <span class="note" id="matches"></span></p>
+<table id="table"><thead></thead><tbody></tbody></table>
+<script>
+const ROWS_SHOWN = 100;
+Promise.all(["figures.json", "aggregates.json", "studies.json"].map(f => fetch(f).then(r => r.json())))
+  .then(([figures, aggregates, studies]) => {
+    document.getElementById("total").textContent = aggregates.n_rows;
+    for (const [name, figure] of Object.entries(figures)) {
+      Plotly.newPlot(name, figure.data, figure.layout, {responsive: true});
+    }
+    // Columns come as plain lists, or as {labels, codes} for the categoricals.
+    const columns = Object.keys(studies.columns);
+    const values = columns.map(col => {
+      const c = studies.columns[col];
+      return Array.isArray(c) ? c : c.codes.map(code => code < 0 ? null : c.labels[code]);
+    });
+    const rows = values[0].map((_, i) => values.map(v => v[i]));
+    const text = rows.map(row => row.join(" ").toLowerCase());
+    document.querySelector("#table thead").innerHTML =
+      "<tr>" + columns.map(c => "<th>" + c + "</th>").join("") + "</tr>";
+    const escape = v => v === null ? "" : String(v).replace(/[&<>]/g, ch => ({"&": "&amp;", "<": "&lt;", ">": "&gt;"})[ch]);
+    const show = () => {
+      const words = document.getElementById("search").value.toLowerCase().split(/\\s+/).filter(Boolean);
+      const hits = rows.filter((_, i) => words.every(w => text[i].includes(w)));
+      document.getElementById("matches").textContent =
+        hits.length + " studies" + (hits.length > ROWS_SHOWN ? ", first " + ROWS_SHOWN + " shown" : "");
+      document.querySelector("#table tbody").innerHTML = hits.slice(0, ROWS_SHOWN)
+        .map(row => "<tr>" + row.map(v => "<td>" + escape(v) + "</td>").join("") + "</tr>").join("");
+    };
+    document.getElementById("search").addEventListener("input", show);
+    show();
+  });
+</script>
+</body>
+</html>
+"""
+
+
+# -----------------------------------------------------------------------------
+# Site content
+# -----------------------------------------------------------------------------
+def figures(cube):
+    return {name: json.loads(charts.figure_json(name, cube)) for name in charts.PLOTLY_CHARTS}
+
+
+def aggregates_json(cube):
+    """Counts per year and per category of every column; enough to redraw any count chart."""
+    return {
+        'n_rows': cube.n_rows,
+        'years': {str(year): int(n) for year, n in cube.year_counts.items()},
+        'categories': {
+            col: {str(label): int(n) for label, n in cube.category_counts(col).items()}
+            for col in cube.counts
+        },
+    }
+
+
+def studies_json(slice_df):
+    columns = {}
+    for col in slice_df.columns:
+        series = slice_df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            columns[col] = {'labels': [str(label) for label in series.cat.categories],
+                            'codes': series.cat.codes.tolist()}
+        else:
+            columns[col] = [None if pd.isna(value) else value for value in series.tolist()]
+    return {'columns': columns}
+
+
+def page(version, app_url):
+    app_link = (f'<a href="{app_url}">Open the interactive dashboard</a> to filter the data, '
+                f'register and download the dataset.') if app_url else ""
+    nav = "".join(f'<a href="#section-{i}">{title}</a>' for i, (title, _) in enumerate(SECTIONS))
+    nav += '<a href="#studies">Studies</a>'
+    sections = "\n".join(
+        f'<h2 id="section-{i}">{title}</h2>\n'
+        + "\n".join(f'<div class="chart" id="{name}"></div>' for name in names)
+        for i, (title, names) in enumerate(SECTIONS)
+    )
+    return (PAGE_TEMPLATE
+            .replace("__PLOTLYJS_VERSION__", plotly.offline.get_plotlyjs_version())
+            .replace("__VERSION__", version[:12])
+            .replace("__BUILT__", time.strftime('%Y-%m-%d'))
+            .replace("__APP_LINK__", app_link)
+            .replace("__NAV__", nav)
+            .replace("__SECTIONS__", sections))
+
+
+def build(version, output, app_url):
+    clean = normalize(dataset.load_data(version))
+    cube = AggregateCube(ColumnCodes(clean))
+    slice_df = clean[[col for col in STUDY_COLUMNS if col in clean.columns]]
+
+    files = {}
+    with telemetry.span("static.figures"):
+        files['figures.json'] = json.dumps(figures(cube), separators=(',', ':'))
+    files['aggregates.json'] = json.dumps(aggregates_json(cube), separators=(',', ':'))
+    files['studies.json'] = json.dumps(studies_json(slice_df), separators=(',', ':'))
+    buffer = io.BytesIO()
+    slice_df.to_parquet(buffer, index=False)
+    # index.html last, so the page never points at files of an older build.
+    for name, data in files.items():
+        atomic_write(os.path.join(output, name), data.encode("utf-8"))
+    atomic_write(os.path.join(output, 'studies.parquet'), buffer.getvalue())
+    atomic_write(os.path.join(output, 'index.html'), page(version, app_url).encode("utf-8"))
+    return {name: os.path.getsize(os.path.join(output, name)) for name in list(files) + ['studies.parquet', 'index.html']}
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the REALQUAMI dashboard as a static site.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="output folder (default: site/ next to app.py)")
+    parser.add_argument("--app-url", default="",
+                        help="URL of the Streamlit app, linked for registration and downloads")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild even if the dataset and the code did not change")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    version = dataset.dataset_version()
+    key = hashlib.sha256(
+        f"{version}:{code_version(CODE_MODULES + ['build_static.py'])}:{args.app_url}".encode("utf-8")
+    ).hexdigest()
+    manifest_path = os.path.join(args.output, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r") as f:
+            built = json.load(f).get('key')
+    except (OSError, ValueError):
+        built = None
+    if built == key and not args.force and os.path.exists(os.path.join(args.output, 'index.html')):
+        print(f"{args.output} is up to date with dataset {version[:12]}")
+        return 0
+
+    start = time.perf_counter()
+    sizes = build(version, args.output, args.app_url)
+    atomic_write(manifest_path, json.dumps({'key': key, 'version': version}, indent=2).encode("utf-8"))
+    for name, size in sizes.items():
+        print(f"  {name:<18} {size / 1024:8.1f} KiB")
+    print(f"Built {args.output} for dataset {version[:12]} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
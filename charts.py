@@ -0,0 +1,453 @@
+"""
+Chart definitions for the dashboard.
+
+Every matplotlib chart is a function that takes the AggregateCube and returns a
+Figure; CHARTS maps a chart name to its function. PLOTLY_CHARTS holds the
+interactive versions, also drawn from the cube, so the browser receives a
+handful of aggregated values per chart however many rows the dataset has.
+
+Figures are built with the object-oriented Figure API instead of pyplot, so
+nothing is left in pyplot's global figure registry, and rendering is serialized
+with RENDER_LOCK because matplotlib is not thread-safe. Rendered bytes are kept
+in a FigureCache keyed by input_digest() (a fingerprint of the cube parts the
+chart reads, see CHART_INPUTS) plus chart parameters, so identical charts are
+rasterized once per process instead of once per page view, and survive a
+dataset update or filter that leaves their inputs unchanged.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.graph_objects as go
+import seaborn as sns
+from matplotlib.figure import Figure
+from plotly.subplots import make_subplots
+
+import normalize
+import telemetry
+
+RENDER_LOCK = threading.Lock()
+
+# Streamlit's own st.pyplot() defaults, so cached images look the same.
+DISPLAY_DPI = 200
+
+
+# -----------------------------------------------------------------------------
+# 1. Histogram: Annual Publication Trend
+# -----------------------------------------------------------------------------
+def publication_trend(cube):
+    year_counts = cube.year_counts
+    min_year = year_counts.index.min()
+    max_year = year_counts.index.max()
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    # At least two bin edges, so a filter down to a single year still draws one bar
+    bins = range(min_year, max(max_year, min_year + 1) + 1)
+    sns.histplot(x=year_counts.index, weights=year_counts.values, bins=bins, kde=False, ax=ax)
+    ax.set_title("Annual Publication Trend (Histogram)")
+    ax.set_xlabel("Publication Year")
+    ax.set_ylabel("Number of Publications")
+    fig.tight_layout()
+    return fig
+
+
+# -----------------------------------------------------------------------------
+# 2. Histogram: CA Specialty
+# -----------------------------------------------------------------------------
+def caspecialty_histogram(cube):
+    counts = cube.category_counts('Caspecialty')
+    counts = counts[counts > 0]
+    cat_list = list(counts.index)
+    if 'Unknown' in cat_list:
+        cat_list.remove('Unknown')
+        cat_list.append('Unknown')
+
+    fig = Figure(figsize=(7, 5))
+    ax = fig.subplots()
+    sns.barplot(x=counts.values, y=counts.index, order=cat_list, errorbar=None, ax=ax)
+    for p in ax.patches:
+        width = p.get_width()
+        if width > 0:
+            ax.annotate(f"{int(width)}", (width, p.get_y() + p.get_height()/2), ha='left', va='center')
+    ax.set_title(f"Histogram of CA Specialty [Total: {cube.n_rows}]")
+    ax.set_xlabel("Count of Studies")
+    ax.set_ylabel("CA Specialty")
+    fig.tight_layout()
+    return fig
+
+
+# -----------------------------------------------------------------------------
+# 3. Line Chart: Mean Authors, Institutions, etc. per Paper by Year
+# -----------------------------------------------------------------------------
+MEAN_COUNT_COLUMNS = ['AuthorNum', 'InstitNum', 'AuthorOvNum', 'InstitOvNum']
+
+
+def mean_counts_line(cube):
+    df_line = cube.yearly_means(MEAN_COUNT_COLUMNS).reset_index()
+    fig = Figure(figsize=(7, 4))
+    ax = fig.subplots()
+    for col in MEAN_COUNT_COLUMNS:
+        sns.lineplot(data=df_line, x='IDyear', y=col, marker='o', label=col, ax=ax)
+    ax.set_title("Mean Authors, Institutions, etc. per Paper by Year")
+    ax.set_xlabel("Publication Year")
+    ax.set_ylabel("Mean Count per Paper")
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+# -----------------------------------------------------------------------------
+# 4. Smoothed Line Chart: Median ± IQR of AuthorNum by Year
+# -----------------------------------------------------------------------------
+def author_iqr(cube):
+    # Median is more robust than the sum; Q1 and Q3 come precomputed from the cube
+    agg_author = cube.numeric_summary('AuthorNum').reset_index()
+    years = agg_author['IDyear']
+
+    fig = Figure(figsize=(7, 4))
+    ax = fig.subplots()
+    ax.plot(years, agg_author['median'], marker='o', color='steelblue', label='Median AuthorNum')
+    ax.fill_between(years, agg_author['q1'], agg_author['q3'], color='steelblue', alpha=0.2, label='IQR (25%–75%)')
+    ax.set_title("Median ± IQR of AuthorNum by Year")
+    ax.set_xlabel("Publication Year")
+    ax.set_ylabel("Number of Authors per Paper")
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+# -----------------------------------------------------------------------------
+# 5. Six Stacked Bar Charts by Period
+# -----------------------------------------------------------------------------
+PERIOD_CHARTS = [
+    ("Article Type Distribution", 'Article'),
+    ("Field of Study Distribution", 'Field'),
+    ("Study Design (Class) Distribution", 'Class'),
+    ("Level of Study Distribution", 'Level'),
+    ("Quant Study Types Distribution", 'CatQuanti'),
+    ("Data Collection Methods Distribution", 'DataCollect'),
+]
+
+
+def period_stacked_bars(cube):
+    fig = Figure(figsize=(14, 18))
+    axes = fig.subplots(nrows=3, ncols=2).flatten()
+
+    for ax, (title, col) in zip(axes, PERIOD_CHARTS):
+        pivot_df = cube.period_pivot(col)
+        if pivot_df.empty:
+            # A filtered cube can have no labels at all in this column
+            ax.set_title(f"{title}\n(no data)", fontsize=11)
+            ax.set_xticks([])
+            ax.set_yticks([])
+            continue
+        # Order columns so that subvariables are in descending order by overall count (largest at bottom)
+        ordered_cols = pivot_df.sum(axis=0).sort_values(ascending=False).index.tolist()
+        pivot_ordered = pivot_df[ordered_cols]
+
+        # Compute total counts for each subvariable and create a rename mapping (e.g., "Case reports" -> "Case reports (45)")
+        col_sums = pivot_ordered.sum(axis=0)
+        rename_map = {c: f"{c} ({int(col_sums[c])})" for c in pivot_ordered.columns}
+        pivot_renamed = pivot_ordered.rename(columns=rename_map)
+
+        # Calculate the total count for the chart (sum of all cells in the pivot table)
+        chart_total = pivot_df.values.sum()
+
+        pivot_renamed.plot(kind='bar', stacked=True, ax=ax, colormap='tab20')
+        ax.set_title(f"{title}\n(Total: {int(chart_total)})", fontsize=11)
+        ax.set_xlabel("Period")
+        ax.set_ylabel("Number of Studies")
+        ax.legend(loc='upper left', fontsize=8)
+        ax.set_xticklabels(ax.get_xticklabels(), rotation=0)
+
+    fig.tight_layout()
+    return fig
+
+
+# -----------------------------------------------------------------------------
+# 6. Mirror Bar Chart: Condition_primary vs Condition_secondary
+# -----------------------------------------------------------------------------
+def condition_mirror(cube):
+    cond1_counts = cube.category_counts("Condition_primary")
+    cond2_counts = cube.category_counts("Condition_secondary")
+
+    # All categories from Condition_primary in descending order, then any extra
+    # categories from Condition_secondary appended below
+    extra_cats = cond2_counts.index.difference(cond1_counts.index)
+    extra_cats_sorted = cond2_counts.loc[extra_cats].sort_values(ascending=False).index
+    final_index = cond1_counts.index.append(extra_cats_sorted)
+
+    cond1_aligned = cond1_counts.reindex(final_index, fill_value=0)
+    cond2_aligned = cond2_counts.reindex(final_index, fill_value=0)
+    cond2_neg = -cond2_aligned
+
+    fig = Figure(figsize=(14, 8))
+    axes = fig.subplots(nrows=1, ncols=2, sharey=True)
+
+    # --- LEFT CHART: Condition_primary ---
+    axes[0].barh(cond1_aligned.index, cond1_aligned.values, color="skyblue", zorder=2)
+    axes[0].set_title(f"Condition_primary (n={cond1_counts.sum()})", fontsize=12)
+    axes[0].set_xlabel("Count")
+    axes[0].invert_yaxis()  # largest category at top
+    for patch in axes[0].patches:
+        width = patch.get_width()
+        y_center = patch.get_y() + patch.get_height()/2
+        axes[0].annotate(f"{int(width)}", (width, y_center), xytext=(5, 0),
+                         textcoords="offset points", va="center", ha="left", fontsize=9)
+
+    # --- RIGHT CHART: Condition_secondary (mirrored) ---
+    axes[1].barh(cond2_neg.index, cond2_neg.values, color="salmon", zorder=2)
+    axes[1].set_title(f"Condition_secondary (n={cond2_counts.sum()})", fontsize=12)
+    axes[1].set_xlabel("Count")
+    axes[1].invert_yaxis()
+    axes[1].yaxis.tick_right()
+    axes[1].yaxis.set_label_position("right")
+    for patch in axes[1].patches:
+        width = patch.get_width()  # negative
+        y_center = patch.get_y() + patch.get_height()/2
+        axes[1].annotate(f"{int(abs(width))}", (width, y_center), xytext=(-5, 0),
+                         textcoords="offset points", va="center", ha="right", fontsize=9)
+
+    # Dotted lines every 3rd category
+    for i in range(0, len(final_index), 3):
+        axes[0].axhline(i - 0.5, color="grey", linestyle="--", alpha=0.6, zorder=1)
+        axes[1].axhline(i - 0.5, color="grey", linestyle="--", alpha=0.6, zorder=1)
+
+    # Align x-limits for a consistent mirrored look
+    axes[0].set_xlim(0, cond1_aligned.max() * 1.1)
+    axes[1].set_xlim(-cond2_aligned.max() * 1.1, 0)
+
+    fig.tight_layout()
+    return fig
+
+
+CHARTS = {
+    'publication_trend': publication_trend,
+    'caspecialty': caspecialty_histogram,
+    'mean_counts': mean_counts_line,
+    'author_iqr': author_iqr,
+    'period_bars': period_stacked_bars,
+    'condition_mirror': condition_mirror,
+}
+
+# File names (without extension) used when charts are saved to disk.
+FILE_STEMS = {
+    'publication_trend': "Annual_Publication_Trend_Histogram",
+    'caspecialty': "Caspecialty_Histogram",
+    'mean_counts': "LineGraph_TotalCounts",
+    'author_iqr': "LineGraph_AuthorNum_Median_IQR",
+    'period_bars': "Stacked_Bar_Charts_By_Period",
+    'condition_mirror': "Mirror_Bar_Chart_Condition",
+    'journal_sunburst': "Journal_Locality_and_Scope_SunburstChart",
+}
+
+# The parts of the AggregateCube each chart reads (see AggregateCube.digest),
+# the same for its matplotlib and Plotly versions.
+CHART_INPUTS = {
+    'publication_trend': [('year_counts',)],
+    'caspecialty': [('counts', 'Caspecialty'), ('n_rows',)],
+    'mean_counts': [('numeric', col) for col in MEAN_COUNT_COLUMNS],
+    'author_iqr': [('numeric', 'AuthorNum')],
+    'period_bars': [('counts', col) for _, col in PERIOD_CHARTS],
+    'condition_mirror': [('counts', 'Condition_primary'), ('counts', 'Condition_secondary')],
+    'journal_sunburst': [('pairs', ('JournalLoc', 'JournalScop'))],
+}
+
+
+def input_digest(name, cube):
+    """Fingerprint of what chart `name` is drawn from; a cache key that survives unrelated data changes."""
+    return cube.digest(CHART_INPUTS[name])
+
+
+# -----------------------------------------------------------------------------
+# Plotly: Journal Locality and Scope sunburst
+# -----------------------------------------------------------------------------
+def journal_sunburst(cube):
+    # ids/parents/values straight from the (JournalLoc, JournalScop) pair counts.
+    # The ids use the full labels, as two labels can share their shortened form;
+    # only the shown labels are shortened like the *_short columns, hover shows
+    # the full ones.
+    pairs = cube.pair_counts('JournalLoc', 'JournalScop')
+    locs = pairs.index.get_level_values(0)
+    scops = pairs.index.get_level_values(1)
+    scop_short = normalize.shorten_labels(pd.Series(scops, dtype=object))
+
+    loc_totals = pairs.groupby(level=0).sum()
+    loc_scops = pairs.groupby(level=0).apply(lambda s: s.index.get_level_values(1).unique())
+    parent_ids = list(loc_totals.index)
+    parent_labels = normalize.shorten_labels(pd.Series(parent_ids, dtype=object))
+
+    fig = go.Figure(go.Sunburst(
+        ids=[f"{p}/{c}" for p, c in zip(locs, scops)] + parent_ids,
+        labels=list(scop_short) + list(parent_labels),
+        parents=list(locs) + [""] * len(parent_ids),
+        values=list(pairs.values) + list(loc_totals.values),
+        customdata=[[loc, scop] for loc, scop in zip(locs, scops)]
+        + [[loc, loc_scops[loc][0] if len(loc_scops[loc]) == 1 else "(?)"] for loc in loc_totals.index],
+        branchvalues="total",
+        hovertemplate='<b>Journal Loc:</b> %{customdata[0]}<br><b>Journal Scope:</b> %{customdata[1]}<br>Count: %{value}<extra></extra>',
+        textinfo="label+percent entry",
+    ))
+    fig.update_layout(title="Multilayer Pie Chart: Journal Locality and Scope", width=800, height=650)
+    return fig
+
+
+# -----------------------------------------------------------------------------
+# Plotly: interactive versions of the matplotlib charts
+# -----------------------------------------------------------------------------
+def plotly_publication_trend(cube):
+    year_counts = cube.year_counts
+    fig = go.Figure(go.Bar(x=year_counts.index, y=year_counts.values, name="Publications"))
+    fig.update_layout(title="Annual Publication Trend", xaxis_title="Publication Year",
+                      yaxis_title="Number of Publications", bargap=0)
+    return fig
+
+
+def plotly_caspecialty(cube):
+    counts = cube.category_counts('Caspecialty')
+    counts = counts[counts > 0]
+    order = [c for c in counts.index if c != 'Unknown'] + [c for c in counts.index if c == 'Unknown']
+    counts = counts[order]
+    fig = go.Figure(go.Bar(x=counts.values, y=counts.index, orientation='h', text=counts.values))
+    fig.update_layout(title=f"CA Specialty [Total: {cube.n_rows}]", xaxis_title="Count of Studies",
+                      yaxis_title="CA Specialty", yaxis_autorange='reversed')
+    return fig
+
+
+def plotly_mean_counts(cube):
+    means = cube.yearly_means(MEAN_COUNT_COLUMNS)
+    fig = go.Figure([
+        go.Scatter(x=means.index, y=means[col], mode='lines+markers', name=col) for col in MEAN_COUNT_COLUMNS
+    ])
+    fig.update_layout(title="Mean Authors, Institutions, etc. per Paper by Year",
+                      xaxis_title="Publication Year", yaxis_title="Mean Count per Paper")
+    return fig
+
+
+def plotly_author_iqr(cube):
+    summary = cube.numeric_summary('AuthorNum')
+    years = summary.index
+    fig = go.Figure([
+        go.Scatter(x=years, y=summary['q3'], mode='lines', line_width=0, showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=years, y=summary['q1'], mode='lines', line_width=0, fill='tonexty',
+                   fillcolor='rgba(70, 130, 180, 0.2)', name='IQR (25%–75%)'),
+        go.Scatter(x=years, y=summary['median'], mode='lines+markers', line_color='steelblue',
+                   name='Median AuthorNum'),
+    ])
+    fig.update_layout(title="Median ± IQR of AuthorNum by Year", xaxis_title="Publication Year",
+                      yaxis_title="Number of Authors per Paper")
+    return fig
+
+
+def plotly_period_bars(cube):
+    fig = make_subplots(rows=3, cols=2, subplot_titles=[title for title, _ in PERIOD_CHARTS])
+    for i, (_, col) in enumerate(PERIOD_CHARTS):
+        pivot = cube.period_pivot(col)
+        ordered = pivot.sum(axis=0).sort_values(ascending=False).index
+        for category in ordered:
+            fig.add_trace(
+                go.Bar(x=pivot.index, y=pivot[category], name=f"{category} ({int(pivot[category].sum())})",
+                       legendgroup=col, legendgrouptitle_text=col),
+                row=i // 2 + 1, col=i % 2 + 1,
+            )
+    fig.update_layout(barmode='stack', height=1200, title="Research Characteristics by Period")
+    return fig
+
+
+def plotly_condition_mirror(cube):
+    primary = cube.category_counts("Condition_primary")
+    secondary = cube.category_counts("Condition_secondary")
+    extra = secondary.index.difference(primary.index)
+    order = primary.index.append(secondary.loc[extra].sort_values(ascending=False).index)
+    primary = primary.reindex(order, fill_value=0)
+    secondary = secondary.reindex(order, fill_value=0)
+    fig = go.Figure([
+        go.Bar(y=order, x=primary.values, orientation='h', name=f"Condition_primary (n={primary.sum()})",
+               marker_color='skyblue'),
+        go.Bar(y=order, x=-secondary.values, orientation='h', name=f"Condition_secondary (n={secondary.sum()})",
+               marker_color='salmon', customdata=secondary.values, hovertemplate='%{y}: %{customdata}'),
+    ])
+    fig.update_layout(title="Condition Primary vs Condition Secondary", barmode='relative',
+                      yaxis_autorange='reversed', height=700, xaxis_title="Count")
+    return fig
+
+
+PLOTLY_CHARTS = {
+    'publication_trend': plotly_publication_trend,
+    'caspecialty': plotly_caspecialty,
+    'mean_counts': plotly_mean_counts,
+    'author_iqr': plotly_author_iqr,
+    'period_bars': plotly_period_bars,
+    'condition_mirror': plotly_condition_mirror,
+    'journal_sunburst': journal_sunburst,
+}
+
+
+def figure_json(name, cube):
+    """
+    Serialized Plotly figure for the browser. The Plotly template is left out:
+    st.plotly_chart applies the Streamlit theme anyway, and the template alone
+    is several times larger than the data.
+    """
+    with telemetry.span(f"render.{name}", fmt='plotly'):
+        fig = PLOTLY_CHARTS[name](cube)
+        fig.layout.template = None
+        return fig.to_json()
+
+
+# -----------------------------------------------------------------------------
+# Rendering and caching
+# -----------------------------------------------------------------------------
+def render(name, cube, fmt='png', dpi=DISPLAY_DPI):
+    """Render one chart from CHARTS to PNG/SVG/PDF bytes."""
+    with RENDER_LOCK, telemetry.span(f"render.{name}", fmt=fmt, dpi=dpi):
+        fig = CHARTS[name](cube)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class FigureCache:
+    """
+    Thread-safe LRU cache of rendered chart payloads (image bytes or Plotly JSON),
+    bounded by the total size of the stored values.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get_or_create(self, key, create):
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def __len__(self):
+        return len(self._items)
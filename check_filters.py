@@ -0,0 +1,73 @@
+"""
+Check that every chart can be drawn for narrow filter selections.
+
+    python check_filters.py
+
+The sidebar filters drive every chart, so a chart can be handed a cube with
+only a few rows, in which some columns have no labels at all. The narrowest
+selections the sidebar can make are built here: every single year, and every
+single label of every filter column. Every matplotlib chart (charts.CHARTS)
+and every Plotly chart (charts.PLOTLY_CHARTS) is built from the cube of each
+one. An empty selection is skipped, as app.py shows a message instead of the
+charts then.
+
+Exits 1 and lists the failures if any chart raises.
+"""
+import argparse
+import sys
+import warnings
+
+import charts
+import dataset
+import filters
+from aggregates import AggregateCube, ColumnCodes
+from normalize import normalize
+
+
+def selections(index):
+    """(description, filter spec) of every single year and every single label of a filter column."""
+    year_min, year_max = index.year_bounds
+    for year in range(year_min, year_max + 1):
+        yield f"year {year}", filters.make_spec((year, year), {})
+    for col in index.labels:
+        for label in index.labels[col]:
+            yield f"{col} = {label}", filters.make_spec((year_min, year_max), {col: [label]})
+
+
+def check(codes, index):
+    """Failures of drawing every chart for every selection, as messages."""
+    problems = []
+    for what, spec in selections(index):
+        rows = index.select(spec)
+        cube = AggregateCube(codes, rows)
+        if cube.n_rows == 0:
+            continue
+        for name, build in list(charts.CHARTS.items()) + list(charts.PLOTLY_CHARTS.items()):
+            try:
+                build(cube)
+            except Exception as e:
+                problems.append(f"{name} for {what}: {type(e).__name__}: {e}")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Draw every chart for narrow filter selections.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    parse_args(argv)
+    codes = ColumnCodes(normalize(dataset.load_data()))
+    index = filters.FilterIndex(codes)
+    with warnings.catch_warnings():
+        # Single-bar charts make matplotlib warn about singular axis limits.
+        warnings.simplefilter("ignore", UserWarning)
+        problems = check(codes, index)
+    for problem in problems:
+        print(f"  failed  {problem}")
+    print("Every chart draws for every selection" if not problems else f"{len(problems)} failures")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
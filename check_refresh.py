@@ -0,0 +1,121 @@
+"""
+Check that an incremental refresh gives what a full rebuild gives.
+
+    python check_refresh.py
+    python check_refresh.py --seed 3 --changes 25
+
+Starting from the current dataset, a second version is made by removing,
+changing and adding rows: a changed row gets a label no other row has, a
+count change and a move to another year, and the added rows include a year not
+seen before. DatasetStore builds the first version in full and the second one
+incrementally (refresh.py), and the result is compared with normalize() plus
+AggregateCube.from_frame() on the second version:
+
+- the clean frame, values and dtypes;
+- every count series and the numeric summaries of the cube;
+- charts.input_digest() of every chart, so the figure cache would serve the
+  same images either way.
+
+Exits 1 and lists the differences if anything does not match.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import charts
+import dataset
+import refresh
+from aggregates import AggregateCube
+from normalize import normalize
+
+
+class SyntheticStore(refresh.DatasetStore):
+    """A DatasetStore whose versions are frames held in memory."""
+
+    def __init__(self, frames):
+        super().__init__()
+        self.frames = frames
+
+    def load_raw(self, version):
+        return self.frames[version]
+
+
+def next_version(raw, n_changes, seed):
+    """`raw` with n_changes rows removed, n_changes changed and n_changes added."""
+    rng = np.random.default_rng(seed)
+    positions = rng.choice(len(raw), size=2 * n_changes, replace=False)
+    removed, changed = positions[:n_changes], positions[n_changes:]
+
+    new = raw.copy()
+    changed_index = new.index[changed]
+    new.loc[changed_index[0], 'Caspecialty'] = "specialty not seen before"
+    new.loc[changed_index[1:], 'Field'] = new['Field'].dropna().iloc[0]
+    new.loc[changed_index, 'AuthorNum'] = rng.integers(1, 20, size=len(changed))
+    new.loc[changed_index[-1], 'IDyear'] = new['IDyear'].min()
+    new = new.drop(index=raw.index[removed])
+
+    added = raw.iloc[rng.choice(len(raw), size=n_changes, replace=False)].copy()
+    added['UniqueID'] = raw['UniqueID'].max() + 1 + np.arange(n_changes)
+    added.loc[added.index[0], 'IDyear'] = raw['IDyear'].max() + 1
+    added.index = new.index.max() + 1 + np.arange(n_changes)
+    return pd.concat([new, added])
+
+
+def compare(patched, full):
+    """Differences between the incremental Dataset and a full rebuild, as messages."""
+    problems = []
+
+    def check(what, assert_equal, left, right):
+        try:
+            assert_equal(left, right)
+        except AssertionError as e:
+            problems.append(f"{what}: {str(e).splitlines()[0]}")
+
+    clean = normalize(full)
+    cube = AggregateCube.from_frame(clean)
+    check("clean frame", pd.testing.assert_frame_equal, patched.clean, clean)
+    check("year counts", pd.testing.assert_series_equal, patched.cube.year_counts, cube.year_counts)
+    for col in cube.counts:
+        check(f"counts of {col}", pd.testing.assert_series_equal, patched.cube.counts[col], cube.counts[col])
+    for pair in cube.pairs:
+        check(f"pair counts of {pair}", pd.testing.assert_series_equal, patched.cube.pairs[pair], cube.pairs[pair])
+    check("numeric summaries", pd.testing.assert_frame_equal, patched.cube.numeric, cube.numeric)
+    if patched.cube.n_rows != cube.n_rows:
+        problems.append(f"n_rows: {patched.cube.n_rows} != {cube.n_rows}")
+    for name in charts.CHART_INPUTS:
+        if charts.input_digest(name, patched.cube) != charts.input_digest(name, cube):
+            problems.append(f"input digest of {name} differs")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare an incremental dataset refresh with a full rebuild.")
+    parser.add_argument("--changes", type=int, default=10,
+                        help="rows removed, changed and added each (default: 10)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    first = dataset.load_data()
+    second = next_version(first, args.changes, args.seed)
+    store = SyntheticStore({'first': first, 'second': second})
+    store.get('first')
+    patched = store.get('second')
+    if patched.delta is None:
+        print("The second version was rebuilt in full, not refreshed; lower --changes")
+        return 1
+    print(f"Refreshed incrementally: {patched.delta}")
+
+    problems = compare(patched, second)
+    for problem in problems:
+        print(f"  mismatch  {problem}")
+    print("Matches a full rebuild" if not problems else f"{len(problems)} mismatches")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
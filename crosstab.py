@@ -0,0 +1,128 @@
+"""
+Cross-tabulation of any two categorical columns, optionally by time bin.
+
+cross_tab() works on the factorized codes of aggregates.ColumnCodes, like the
+aggregate cube: the (time bin, row label, column label) triples of the selected
+rows are packed into one integer each and counted with a single np.bincount, so
+the cost is one pass over the selected rows whatever the columns. The result
+holds the counts, the row percentages and a chi-square test of independence for
+the whole table and for every time bin.
+
+The p-value needs the optional scipy package; without it only the statistic and
+the degrees of freedom are given.
+"""
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+from aggregates import CATEGORICAL_COLUMNS
+
+# label -> bin width in years (None: all years in one table)
+BINNINGS = {
+    "All years": None,
+    "Year": 1,
+    "5-year": 5,
+    "Decade": 10,
+}
+BIN_COLUMN = 'Years'
+
+HAVE_SCIPY = importlib.util.find_spec("scipy") is not None
+
+
+def chi_square(table):
+    """(statistic, degrees of freedom, p-value or None) of a counts table; empty rows and columns are left out."""
+    observed = np.asarray(table, dtype=float)
+    observed = observed[observed.sum(axis=1) > 0][:, observed.sum(axis=0) > 0]
+    dof = (observed.shape[0] - 1) * (observed.shape[1] - 1) if observed.size else 0
+    if dof <= 0:
+        return None, 0, None
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / observed.sum()
+    statistic = float(((observed - expected) ** 2 / expected).sum())
+    p_value = None
+    if HAVE_SCIPY:
+        from scipy.stats import chi2
+
+        p_value = float(chi2.sf(statistic, dof))
+    return statistic, dof, p_value
+
+
+def _bin_labels(starts, width):
+    if width == 1:
+        return [str(start) for start in starts]
+    return [f"{start}-{start + width - 1}" for start in starts]
+
+
+class CrossTab:
+    """Counts, row percentages and chi-square of one (row column, column column, binning)."""
+
+    def __init__(self, counts, row_col, col_col, binning):
+        self.row_col = row_col
+        self.col_col = col_col
+        self.binning = binning
+        self.counts = counts
+        self.n_rows = int(counts.to_numpy().sum())
+        self.row_percent = counts.div(counts.sum(axis=1).replace(0, np.nan), axis=0).mul(100).round(1)
+
+        overall = counts.groupby(level=row_col).sum() if BIN_COLUMN in counts.index.names else counts
+        self.chi_square = chi_square(overall)
+        self.chi_square_by_bin = None
+        if BIN_COLUMN in counts.index.names:
+            rows = []
+            for label, table in counts.groupby(level=BIN_COLUMN, sort=False):
+                statistic, dof, p_value = chi_square(table)
+                rows.append({BIN_COLUMN: label, 'n': int(table.to_numpy().sum()),
+                             'chi-square': statistic, 'dof': dof, 'p-value': p_value})
+            columns = [BIN_COLUMN, 'n', 'chi-square', 'dof'] + (['p-value'] if HAVE_SCIPY else [])
+            self.chi_square_by_bin = pd.DataFrame(rows, columns=columns)
+
+
+def cross_tab(codes, row_col, col_col, binning="All years", rows=None):
+    """
+    CrossTab of `row_col` x `col_col` over the rows of `codes` (a ColumnCodes),
+    restricted to the row positions in `rows` if given. Rows missing either
+    label are left out.
+    """
+    if row_col not in codes.codes or col_col not in codes.codes:
+        raise KeyError(f"cross_tab needs two of {CATEGORICAL_COLUMNS}")
+    take = (lambda a: a) if rows is None else (lambda a: a[rows])
+    row_codes = take(codes.codes[row_col]).astype(np.int64)
+    col_codes = take(codes.codes[col_col]).astype(np.int64)
+    row_labels = codes.labels[row_col]
+    col_labels = codes.labels[col_col]
+
+    width = BINNINGS[binning]
+    if width is None:
+        bin_codes = np.zeros(len(row_codes), dtype=np.int64)
+        bin_starts = np.array([0])
+    else:
+        years = codes.years[take(codes.year_codes)].astype(np.int64)
+        first = int(codes.years.min()) // width * width
+        bin_codes = (years - first) // width
+        bin_starts = first + np.arange((int(codes.years.max()) - first) // width + 1) * width
+
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    n_rows, n_cols = len(row_labels), len(col_labels)
+    keys = (bin_codes[valid] * n_rows + row_codes[valid]) * n_cols + col_codes[valid]
+    cube = np.bincount(keys, minlength=len(bin_starts) * n_rows * n_cols)
+    cube = cube.reshape(len(bin_starts), n_rows, n_cols)
+
+    # Only the labels (and bins) that occur in the selection.
+    used_cols = np.flatnonzero(cube.sum(axis=(0, 1)))
+    if width is None:
+        used_rows = np.flatnonzero(cube[0].sum(axis=1))
+        counts = pd.DataFrame(
+            cube[0][np.ix_(used_rows, used_cols)],
+            index=pd.Index(row_labels[used_rows], name=row_col),
+            columns=pd.Index(col_labels[used_cols], name=col_col),
+        )
+    else:
+        used = cube.sum(axis=2) > 0
+        bin_idx, row_idx = np.nonzero(used)
+        bins = np.array(_bin_labels(bin_starts, width), dtype=object)
+        counts = pd.DataFrame(
+            cube[bin_idx, row_idx][:, used_cols],
+            index=pd.MultiIndex.from_arrays([bins[bin_idx], row_labels[row_idx]], names=[BIN_COLUMN, row_col]),
+            columns=pd.Index(col_labels[used_cols], name=col_col),
+        )
+    return CrossTab(counts, row_col, col_col, binning)
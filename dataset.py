@@ -0,0 +1,250 @@
+"""
+Dataset loading for the REALQUAMI dashboard.
+
+The CSV committed next to app.py is the source of truth. It is parsed once into
+a Parquet snapshot under .cache/, keyed by the SHA-256 of the CSV bytes, so a
+cold start only has to read the columnar snapshot. Parsing is strict (see
+ingest.py): rows that fail the schema checks are kept out of the snapshot and
+written next to it as a quarantine table for the curators. The copy on GitHub is checked
+in a background thread with ETag revalidation; when its content differs from
+the local file it is stored in .cache/upstream.csv and picked up on the next
+rerun. The dashboard never waits on the network.
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+import ingest
+import telemetry
+
+DATA_URL = "https://raw.githubusercontent.com/boonhowchew/malaysia-primary-care-research/main/REALQUAMI_Dataset_Merged.csv"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_CSV = os.path.join(BASE_DIR, "REALQUAMI_Dataset_Merged.csv")
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+UPSTREAM_CSV = os.path.join(CACHE_DIR, "upstream.csv")
+MANIFEST_FILE = os.path.join(CACHE_DIR, "manifest.json")
+
+REVALIDATE_INTERVAL = 15 * 60  # seconds between upstream checks
+REQUEST_TIMEOUT = 10  # seconds
+
+_lock = threading.Lock()
+_hash_memo = {}
+_revalidator = None
+
+
+def _file_mode():
+    # os.umask can only be read by setting it, so this runs once, at import.
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp makes files only the owner can read; written files get the mode
+# open() would give them, so a web server running as another user can serve
+# site/, charts/ and the publication outputs.
+FILE_MODE = _file_mode()
+
+
+# -----------------------------------------------------------------------------
+# Small file helpers
+# -----------------------------------------------------------------------------
+def atomic_write(path, data):
+    """Write bytes to path via a temp file in the same folder and a rename."""
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_manifest():
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_manifest(**fields):
+    with _lock:
+        manifest = read_manifest()
+        manifest.update(fields)
+        atomic_write(MANIFEST_FILE, json.dumps(manifest, indent=2).encode("utf-8"))
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    """SHA-256 of a file, memoised on (path, size, mtime) so reruns only stat it."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    digest = _hash_memo.get(key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = content_hash(f.read())
+        _hash_memo[key] = digest
+    return digest
+
+
+# -----------------------------------------------------------------------------
+# Versioned loading
+# -----------------------------------------------------------------------------
+def source_path():
+    """The newest known copy of the dataset: the upstream copy if one was fetched."""
+    if os.path.exists(UPSTREAM_CSV):
+        return UPSTREAM_CSV
+    return LOCAL_CSV
+
+
+def dataset_version():
+    """Content hash of the current dataset. Cheap enough to call on every rerun."""
+    return file_hash(source_path())
+
+
+def snapshot_path(version):
+    return os.path.join(CACHE_DIR, f"dataset-{version[:16]}.parquet")
+
+
+def quarantine_path(version):
+    return os.path.join(CACHE_DIR, f"quarantine-{version[:16]}.parquet")
+
+
+def parse_csv(data):
+    """Parse the raw CSV bytes into (frame used by the dashboard, quarantined rows)."""
+    return ingest.read_csv(data)
+
+
+def load_data(version=None, columns=None):
+    """
+    Return the dataset for the given version, reading the Parquet snapshot when
+    one exists and building it from the CSV otherwise. `columns` limits the
+    frame to those columns (only those are read from the snapshot).
+    """
+    if version is None:
+        version = dataset_version()
+    path = snapshot_path(version)
+    if os.path.exists(path) and os.path.exists(quarantine_path(version)):
+        with telemetry.span("dataset.read_snapshot"):
+            return pd.read_parquet(path, columns=columns)
+
+    df, _ = build_snapshot()
+    return df if columns is None else df[columns]
+
+
+def load_quarantine(version=None):
+    """The rows of the given version that failed the ingestion checks, with the reason."""
+    if version is None:
+        version = dataset_version()
+    path = quarantine_path(version)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    _, quarantine = build_snapshot()
+    return quarantine
+
+
+def build_snapshot():
+    """Parse the current CSV and write its snapshot and quarantine table."""
+    with telemetry.span("dataset.parse_csv"):
+        with open(source_path(), "rb") as f:
+            data = f.read()
+        version = content_hash(data)
+        df, quarantine = parse_csv(data)
+    with telemetry.span("dataset.write_snapshot", quarantined=len(quarantine)):
+        write_snapshot(df, quarantine, version)
+    return df, quarantine
+
+
+def _parquet_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def write_snapshot(df, quarantine, version):
+    paths = [quarantine_path(version), snapshot_path(version)]
+    atomic_write(paths[0], _parquet_bytes(quarantine))
+    atomic_write(paths[1], _parquet_bytes(df))
+    # Only the current snapshot is worth keeping around.
+    for pattern in ["dataset-*.parquet", "quarantine-*.parquet"]:
+        for old in glob.glob(os.path.join(CACHE_DIR, pattern)):
+            if old not in paths:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+
+# -----------------------------------------------------------------------------
+# Background revalidation against GitHub
+# -----------------------------------------------------------------------------
+def revalidate_upstream():
+    """
+    Ask GitHub whether the CSV changed since the last check. Returns True when a
+    new version was stored locally.
+    """
+    manifest = read_manifest()
+    request = urllib.request.Request(DATA_URL)
+    if manifest.get("etag"):
+        request.add_header("If-None-Match", manifest["etag"])
+    try:
+        with telemetry.span("dataset.revalidate"), \
+                urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            data = response.read()
+            etag = response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            update_manifest(checked=time.time())
+        return False
+    except (urllib.error.URLError, OSError):
+        # Offline or GitHub unreachable: keep serving what we have.
+        return False
+
+    digest = content_hash(data)
+    changed = digest != dataset_version()
+    if digest == file_hash(LOCAL_CSV):
+        # The repository copy has caught up with GitHub.
+        if os.path.exists(UPSTREAM_CSV):
+            os.remove(UPSTREAM_CSV)
+    elif changed:
+        atomic_write(UPSTREAM_CSV, data)
+    update_manifest(etag=etag, upstream_sha256=digest, checked=time.time())
+    return changed
+
+
+def _revalidate_forever():
+    # Respect the last check made by any process sharing this cache folder.
+    last_checked = read_manifest().get("checked", 0)
+    time.sleep(max(0, last_checked + REVALIDATE_INTERVAL - time.time()))
+    while True:
+        revalidate_upstream()
+        time.sleep(REVALIDATE_INTERVAL)
+
+
+def start_revalidation():
+    """Start the background upstream check once per process."""
+    global _revalidator
+    with _lock:
+        if _revalidator is None or not _revalidator.is_alive():
+            _revalidator = threading.Thread(
+                target=_revalidate_forever, name="dataset-revalidation", daemon=True
+            )
+            _revalidator.start()
@@ -0,0 +1,211 @@
+"""
+Downloadable artifacts.
+
+charts/ holds the 300 dpi chart PNGs and the cleansed CSV.
+
+The artifacts are rebuilt only when the dataset version changes, by a single
+background worker, and every file is written atomically (temp file + rename), so
+page views never wait on the export and concurrent sessions never see a half
+written file. The version the folder was built from is stored in
+charts/.export-version.
+
+Registered users can also download the rows matching the current filters as
+CSV, Parquet or XLSX. Those files are written in chunks of CHUNK_ROWS rows
+straight to disk (never as a second full copy of the frame in memory) under
+.cache/subsets/, named after the dataset version, filter spec and format, so
+an identical request is served from the file already written. Only the files
+of the last few dataset versions are kept, so a session still on the previous
+version can read the file it was just given.
+"""
+import glob
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import charts
+import telemetry
+from dataset import BASE_DIR, CACHE_DIR, atomic_write
+
+EXPORT_DIR = os.path.join(BASE_DIR, "charts")
+VERSION_FILE = os.path.join(EXPORT_DIR, ".export-version")
+EXPORT_DPI = 300
+
+# (chart name in charts.CHARTS, file name)
+CHART_EXPORTS = [
+    (name, charts.FILE_STEMS[name] + ".png")
+    for name in ['publication_trend', 'caspecialty', 'mean_counts', 'condition_mirror']
+]
+CLEANSED_CSV = "REALQUAMI_Dataset_Cleansed.csv"
+
+_logger = logging.getLogger(__name__)
+
+
+def export_path(file_name):
+    return os.path.join(EXPORT_DIR, file_name)
+
+
+def exported_version():
+    try:
+        with open(VERSION_FILE, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def export_artifacts(version, df, cube):
+    """Write every artifact for this dataset version, then record the version."""
+    for name, file_name in CHART_EXPORTS:
+        atomic_write(export_path(file_name), charts.render(name, cube, 'png', EXPORT_DPI))
+    with telemetry.span("export.cleansed_csv"):
+        atomic_write(export_path(CLEANSED_CSV), df.to_csv(index=False).encode("utf-8"))
+    # Written last, so the folder only claims a version once it is complete.
+    atomic_write(VERSION_FILE, version.encode("utf-8"))
+
+
+class ExportJob:
+    """Runs export_artifacts on one background thread, once per dataset version."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def ensure(self, version, df, cube):
+        """Schedule an export if charts/ is not built from this version yet."""
+        if exported_version() == version:
+            return
+        with self._lock:
+            if self._pending == version:
+                return
+            self._pending = version
+        self._executor.submit(self._run, version, df, cube)
+
+    def _run(self, version, df, cube):
+        try:
+            with telemetry.span("export", version=version[:12]):
+                if exported_version() != version:
+                    export_artifacts(version, df, cube)
+        except Exception:
+            # Nothing waits on the future, so the failure is logged here; the
+            # next full rerun schedules the export again.
+            _logger.exception("Export of dataset version %s failed", version[:12])
+        finally:
+            with self._lock:
+                if self._pending == version:
+                    self._pending = None
+
+    def is_current(self, version):
+        return exported_version() == version
+
+
+# -----------------------------------------------------------------------------
+# Filtered subsets (CSV / Parquet / XLSX)
+# -----------------------------------------------------------------------------
+SUBSET_DIR = os.path.join(CACHE_DIR, "subsets")
+CHUNK_ROWS = 10_000
+
+# label -> (file extension, mime type)
+SUBSET_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+if importlib.util.find_spec("openpyxl") is None:
+    # XLSX export needs the optional openpyxl package.
+    del SUBSET_FORMATS["XLSX"]
+
+
+def subset_path(version, filter_spec, fmt):
+    spec_hash = hashlib.sha256(repr(filter_spec).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SUBSET_DIR, f"{version[:16]}-{spec_hash}.{SUBSET_FORMATS[fmt][0]}")
+
+
+def _chunks(df, rows):
+    positions = range(len(df)) if rows is None else rows
+    for start in range(0, len(positions), CHUNK_ROWS):
+        yield df.iloc[positions[start:start + CHUNK_ROWS]]
+
+
+def _write_csv(df, rows, f):
+    df.iloc[:0].to_csv(f, index=False, encoding="utf-8")  # header row
+    for chunk in _chunks(df, rows):
+        chunk.to_csv(f, header=False, index=False, encoding="utf-8")
+
+
+def _write_parquet(df, rows, f):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(f, schema) as writer:
+        for chunk in _chunks(df, rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_xlsx(df, rows, f):
+    from openpyxl import Workbook
+
+    # write_only streams rows to disk instead of building the sheet in memory.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("REALQUAMI")
+    sheet.append(list(df.columns))
+    for chunk in _chunks(df, rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(f)
+
+
+SUBSET_WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "XLSX": _write_xlsx}
+
+
+def _prune_subsets(version, keep_versions):
+    """Remove the subset files of all but `version` and the keep_versions - 1 newest other versions."""
+    # A version is as new as its first file: a session still on an old version
+    # can write files after the next version appeared.
+    first_written = {}
+    for path in glob.glob(os.path.join(SUBSET_DIR, "*")):
+        prefix = os.path.basename(path).split("-", 1)[0]
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        first_written[prefix] = min(first_written.get(prefix, mtime), mtime)
+    others = sorted((prefix for prefix in first_written if prefix != version[:16]),
+                    key=first_written.get, reverse=True)
+    kept = {version[:16], *others[:keep_versions - 1]}
+    for path in glob.glob(os.path.join(SUBSET_DIR, "*")):
+        if os.path.basename(path).split("-", 1)[0] not in kept:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def export_subset(version, filter_spec, df, rows, fmt, keep_versions=2):
+    """
+    Path of the `fmt` file with the rows of `df` at positions `rows` (all rows if
+    None), writing it first unless this exact request was exported before. The
+    files of the last `keep_versions` dataset versions are kept, as sessions
+    still on the previous version may be about to read theirs.
+    """
+    path = subset_path(version, filter_spec, fmt)
+    if os.path.exists(path):
+        return path
+    telemetry.miss()
+    os.makedirs(SUBSET_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SUBSET_DIR, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            SUBSET_WRITERS[fmt](df, rows, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _prune_subsets(version, keep_versions)
+    return path
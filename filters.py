@@ -0,0 +1,96 @@
+"""
+Sidebar filters backed by prebuilt indexes.
+
+FilterIndex is built once per dataset version from the factorized codes in
+aggregates.ColumnCodes. It keeps
+
+- the row positions sorted by year, so a year range is two binary searches and
+  a slice;
+- a packed bitmap (np.packbits, one bit per row) for every category of every
+  filter column, so a multi-select is an OR of bitmaps and combining filters is
+  an AND.
+
+A filter change is therefore a handful of bitwise operations on n/8 bytes,
+followed by re-aggregating only the matching rows (AggregateCube(codes, rows)).
+
+A filter spec is a hashable tuple, so it can key Streamlit caches:
+    (year_min, year_max, ((column, (label, ...)), ...))
+"""
+import numpy as np
+
+FILTER_COLUMNS = ['Caspecialty', 'Field', 'Class', 'JournalLoc', 'Setting']
+FILTER_LABELS = {
+    'Caspecialty': "CA Specialty",
+    'Field': "Field of Study",
+    'Class': "Study Design (Class)",
+    'JournalLoc': "Journal Locality",
+    'Setting': "Setting",
+}
+
+
+def make_spec(year_range, selections):
+    """Build a filter spec from a (min, max) year range and {column: [labels]}."""
+    columns = tuple(
+        (col, tuple(sorted(labels))) for col, labels in sorted(selections.items()) if labels
+    )
+    return (int(year_range[0]), int(year_range[1]), columns)
+
+
+class FilterIndex:
+    """Year order and per-category bitmaps for one version of the dataset."""
+
+    def __init__(self, codes):
+        self.n_rows = codes.n_rows
+        self.years = codes.years
+        year_codes = codes.year_codes
+        self.year_order = np.argsort(year_codes, kind='stable')
+        self.sorted_year_codes = year_codes[self.year_order]
+
+        self.labels = {}
+        self.bitmaps = {}
+        self.label_counts = {}
+        for col in FILTER_COLUMNS:
+            if col not in codes.codes:
+                continue
+            col_codes = codes.codes[col]
+            labels = codes.labels[col]
+            self.labels[col] = list(labels)
+            self.label_counts[col] = np.bincount(col_codes[col_codes >= 0], minlength=len(labels))
+            self.bitmaps[col] = {
+                label: np.packbits(col_codes == code) for code, label in enumerate(labels)
+            }
+
+    @property
+    def year_bounds(self):
+        return int(self.years.min()), int(self.years.max())
+
+    def options(self, col):
+        """Labels of a filter column, most frequent first."""
+        order = np.argsort(-self.label_counts[col], kind='stable')
+        return [self.labels[col][i] for i in order]
+
+    def is_unfiltered(self, spec):
+        year_min, year_max, columns = spec
+        return (year_min, year_max) == self.year_bounds and not columns
+
+    def _year_bitmap(self, year_min, year_max):
+        lo_code, hi_code = np.searchsorted(self.years, [year_min, year_max + 1])
+        lo, hi = np.searchsorted(self.sorted_year_codes, [lo_code, hi_code])
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.year_order[lo:hi]] = True
+        return np.packbits(mask)
+
+    def select(self, spec):
+        """Sorted row positions matching a filter spec, or None for "all rows"."""
+        if self.is_unfiltered(spec):
+            return None
+        year_min, year_max, columns = spec
+        bitmap = None
+        if (year_min, year_max) != self.year_bounds:
+            bitmap = self._year_bitmap(year_min, year_max)
+        for col, labels in columns:
+            col_bitmap = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            for label in labels:
+                col_bitmap |= self.bitmaps[col].get(label, 0)
+            bitmap = col_bitmap if bitmap is None else bitmap & col_bitmap
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
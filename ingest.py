@@ -0,0 +1,123 @@
+"""
+Strict ingestion of the REALQUAMI CSV.
+
+The CSV is parsed by pyarrow.csv with every column read as text, then the typed
+columns of schema.COLUMN_TYPES are converted and checked here:
+
+    id     UniqueID must be a whole number, present and not repeated
+    year   IDyear must be a whole number between MIN_YEAR and next year
+    count  the count columns must be finite, whole, non-negative numbers when
+           present
+
+A row that fails any check, and a record with the wrong number of fields
+(which the old parser dropped without a word), is not loaded. It goes to the
+quarantine table instead, with the reason, so the curators can fix the CSV.
+The header must have every column of the schema that normalize.py does not
+derive (REQUIRED_COLUMNS): the charts, filters, cross-tab, study browser and
+search read them by name, so a CSV without one of them is refused as a whole.
+"""
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+
+import normalize
+import schema
+
+REQUIRED_COLUMNS = [col for col in schema.COLUMN_TYPES if col not in normalize.DERIVED_COLUMNS]
+MIN_YEAR = 1900
+
+QUARANTINE_COLUMNS = ['UniqueID', 'IDname', 'reason', 'text']
+
+
+def max_year():
+    return datetime.date.today().year + 1
+
+
+def _quarantine(rows):
+    return pd.DataFrame(rows, columns=QUARANTINE_COLUMNS).astype("string")
+
+
+def _whole_numbers(series):
+    """Numeric values of a text column, and a mask of the present values that are not finite whole numbers."""
+    values = pd.to_numeric(series, errors='coerce')
+    bad = series.notna() & (values.isna() | ~np.isfinite(values) | (values != values.round()))
+    return values, bad
+
+
+def read_csv(data):
+    """
+    Parse the raw CSV bytes. Returns (df, quarantine): the rows that passed the
+    checks, typed, and one row per rejected record with the reason.
+    """
+    malformed = []
+
+    def skip(row):
+        # row.number is the line in the file, or -1 if pyarrow could not tell.
+        line = f"line {row.number}: " if row.number is not None and row.number >= 0 else ""
+        malformed.append({
+            'reason': f"{line}expected {row.expected_columns} fields, found {row.actual_columns}",
+            'text': row.text[:500],
+        })
+        return 'skip'
+
+    table = pv.read_csv(
+        io.BytesIO(data),
+        parse_options=pv.ParseOptions(newlines_in_values=True, invalid_row_handler=skip),
+        convert_options=pv.ConvertOptions(
+            column_types={col: pa.string() for col in schema.COLUMN_TYPES},
+            strings_can_be_null=True,
+        ),
+    )
+    missing = [col for col in REQUIRED_COLUMNS if col not in table.column_names]
+    if missing:
+        raise ValueError(f"the dataset CSV has no {', '.join(missing)} column{'s' if len(missing) > 1 else ''}")
+    df = table.to_pandas()
+
+    reasons = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    def reject(mask, reason):
+        # Only the first problem found is reported for a row.
+        mask = mask.fillna(False) & reasons.isna()
+        reasons[mask] = reason[mask] if isinstance(reason, pd.Series) else reason
+
+    ids, bad = _whole_numbers(df['UniqueID'])
+    reject(df['UniqueID'].isna(), "UniqueID is missing")
+    reject(bad, "UniqueID is not a whole number: " + df['UniqueID'].fillna(""))
+    reject(ids.duplicated(keep='first') & ids.notna(), "UniqueID is repeated")
+
+    years, bad = _whole_numbers(df['IDyear'])
+    reject(df['IDyear'].isna(), "IDyear is missing")
+    reject(bad, "IDyear is not a year: " + df['IDyear'].fillna(""))
+    low, high = MIN_YEAR, max_year()
+    reject((years < low) | (years > high), f"IDyear outside {low}-{high}: " + df['IDyear'].fillna(""))
+
+    counts = {}
+    for col in schema.columns_of('count'):
+        if col in df.columns:
+            counts[col], bad = _whole_numbers(df[col])
+            bad |= counts[col] < 0
+            reject(bad, f"{col} is not a count: " + df[col].fillna(""))
+
+    rejected = reasons.notna().to_numpy()
+    quarantine = _quarantine(malformed + [
+        {
+            'UniqueID': df.at[position, 'UniqueID'],
+            'IDname': df.at[position, 'IDname'] if 'IDname' in df.columns else None,
+            'reason': reasons.iat[position],
+        }
+        for position in np.flatnonzero(rejected)
+    ])
+
+    df['UniqueID'] = ids
+    df['IDyear'] = years
+    for col, values in counts.items():
+        df[col] = values
+    df = df[~rejected].reset_index(drop=True)
+    # Every row left has both, so the integer casts cannot meet a NaN.
+    df['UniqueID'] = df['UniqueID'].astype(np.int64)
+    df['IDyear'] = df['IDyear'].astype(np.int64)
+    return df, quarantine
@@ -0,0 +1,402 @@
+"""
+Load-test the dashboard: many concurrent viewers of one `streamlit run` server.
+
+    python load_test.py                              # 1, 2, 4 and 8 sessions
+    python load_test.py --sessions 1 8 16 --reruns 10 --output load.json
+
+The app is served by a single `streamlit run app.py` process, as in a
+deployment, and every simulated viewer is a websocket client of it speaking the
+browser's protocol: it asks for a script run with its widget values
+(BackMsg.rerun_script) and reads the page back (ForwardMsg) until the run has
+finished. A widget inside a fragment reruns only that fragment, as in the
+browser. The sessions therefore compete for what real viewers compete for in
+one process: the GIL, the st.cache_resource caches, the FigureCache and
+RENDER_LOCK, and the SQLite connection of visitors.VisitorStore. The clients
+are threads of this process; they only send widget values and parse replies.
+They need the websockets package, which recent Streamlit releases install.
+
+A session loads the page, registers (a --register-share of them), then reruns
+--reruns times, each rerun changing a filter, the browser page or the search
+box, or simply reloading.
+
+The server runs from a copy of the repository in a scratch folder (the sources,
+the CSV and, unless --cold, the .cache/ snapshots), so the load test never
+touches the real visitors.db or charts/ folder. Unless --cold, the page is
+loaded once, untimed, before the first level, so the levels measure a server
+that is already up.
+
+For every concurrency level the report gives p50/p95/max rerun latency, overall
+and per action, throughput in reruns per second, the resident memory of the
+server, script errors, and errors that look like contention on shared state
+(locked database, missing or half-written files). The registrations found in
+the database afterwards are checked against the number the app confirmed, so a
+lost write shows up too.
+"""
+import argparse
+import contextlib
+import glob
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import DoubleArray
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SANDBOX_FILES = ["*.py", "REALQUAMI_Dataset_Merged.csv", "Flow.png"]
+
+DEFAULT_SESSIONS = [1, 2, 4, 8]
+RUN_TIMEOUT = 300  # seconds for a single script run
+
+ACTIONS = ['filter', 'page', 'search', 'reload']
+SEARCH_QUERIES = ["diabetes", "hypertension care", "primary care clinic", "asthma", "malaysia"]
+CONSENT_LABEL = "I agree to the terms of use and consent to provide my personal data."
+
+# Substrings of error messages caused by sessions fighting over shared state.
+CONTENTION_PATTERNS = [
+    "database is locked", "database table is locked", "busy", "PermissionError",
+    "FileNotFoundError", "No such file", "BlockingIOError", "ArrowInvalid", "EOFError",
+    "UnpicklingError",
+]
+
+
+# -----------------------------------------------------------------------------
+# Sandbox and server
+# -----------------------------------------------------------------------------
+def prepare_sandbox(folder, warm=True):
+    """Copy what app.py needs into `folder`; returns the path of the copied app.py."""
+    for pattern in SANDBOX_FILES:
+        for path in glob.glob(os.path.join(BASE_DIR, pattern)):
+            shutil.copy2(path, folder)
+    cache = os.path.join(BASE_DIR, ".cache")
+    if warm and os.path.isdir(cache):
+        shutil.copytree(cache, os.path.join(folder, ".cache"), ignore=shutil.ignore_patterns("subsets"))
+    return os.path.join(folder, "app.py")
+
+
+def registration_count(folder):
+    path = os.path.join(folder, "visitors.db")
+    if not os.path.exists(path):
+        return 0
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(sandbox):
+    """Run `streamlit run app.py` in the sandbox; yields the server process and its stream URL."""
+    port = free_port()
+    log_path = os.path.join(sandbox, "server.log")
+    with open(log_path, "wb") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", "app.py",
+             "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+            cwd=sandbox, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        deadline = time.monotonic() + RUN_TIMEOUT
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                    break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    with open(log_path, "r", errors="replace") as f:
+                        raise RuntimeError(f"the streamlit server did not start:\n{f.read()[-2000:]}")
+                time.sleep(0.2)
+        yield server, f"ws://127.0.0.1:{port}/_stcore/stream"
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def rss_bytes(pid):
+    """Resident memory of a process, or None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# -----------------------------------------------------------------------------
+# One simulated session
+# -----------------------------------------------------------------------------
+class Session:
+    """A websocket client of the server that drives the app as a browser tab would."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}  # user key, or label if it has none -> (element proto, fragment id)
+        self.states = {}  # widget id -> WidgetState, sent with every run
+        self.headings = []  # headings shown by the last run
+
+    def element(self, name):
+        return self.widgets[name][0]
+
+    def set(self, name, **value):
+        """Give a widget a value for the next run; returns the fragment to rerun ("" for the whole app)."""
+        element, fragment_id = self.widgets[name]
+        self.states[element.id] = WidgetState(id=element.id, **value)
+        return fragment_id
+
+    def run(self, fragment_id=""):
+        """
+        Ask for a script run (of one fragment if given) and read the page until
+        the run has finished; returns the messages of the exceptions it shows.
+        """
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        msg.rerun_script.fragment_id = fragment_id
+        self.ws.send(msg.SerializeToString())
+        # A trigger (the form submit button) fires once.
+        self.states = {widget_id: s for widget_id, s in self.states.items() if not s.trigger_value}
+
+        self.headings = []
+        errors = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv(timeout=RUN_TIMEOUT))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._element(forward.delta.new_element, forward.delta.fragment_id, errors)
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    errors.append("app.py did not compile")
+                # st.rerun() ends a run early and starts the next one straight away.
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return errors
+
+    def _element(self, element, fragment_id, errors):
+        kind = element.WhichOneof("type")
+        proto = getattr(element, kind)
+        if kind == "exception":
+            errors.append(f"{proto.type}: {proto.message}")
+        elif kind == "heading":
+            self.headings.append(proto.body)
+        elif getattr(proto, "id", ""):
+            # Widget ids end in the user key, or "None" if the widget has none.
+            key = proto.id.split("-", 2)[-1]
+            name = key if key != "None" and not key.startswith("FormSubmitter:") else proto.label
+            self.widgets[name] = (proto, fragment_id)
+
+
+def classify(message):
+    return "contention" if any(p in message for p in CONTENTION_PATTERNS) else "error"
+
+
+def timed_run(session, action, samples, fragment_id=""):
+    """Run the script once and record (action, seconds, error kind, message)."""
+    start = time.perf_counter()
+    try:
+        errors = session.run(fragment_id)
+    except Exception as e:
+        message = f"{type(e).__name__}: {e}"
+        samples.append((action, time.perf_counter() - start, classify(message), message))
+        return False
+    seconds = time.perf_counter() - start
+    if errors:
+        samples.append((action, seconds, classify(errors[0]), errors[0]))
+        return False
+    samples.append((action, seconds, None, None))
+    return True
+
+
+def registered(session):
+    """
+    Whether the app confirmed the registration. Its success message is replaced
+    straight away by the rerun it triggers, which shows the visitor analytics
+    only once the registration was stored.
+    """
+    return "Visitor Analytics" in session.headings
+
+
+def register(session, session_id):
+    session.set("First Name *", string_value="Load")
+    session.set("Last Name *", string_value=f"Test {session_id}")
+    session.set("Email Address *", string_value=f"load-test-{session_id}@example.org")
+    session.set(CONSENT_LABEL, bool_value=True)
+    return session.set("Submit Registration", trigger_value=True)
+
+
+def interact(session, action, rng):
+    """Change the widget of `action`; returns the fragment to rerun."""
+    if action == 'filter':
+        slider = session.element("Publication Year")
+        year_min, year_max = int(slider.min), int(slider.max)
+        start = rng.randint(year_min, year_max)
+        years = DoubleArray(data=[start, rng.randint(start, year_max)])
+        return session.set("Publication Year", double_array_value=years)
+    if action == 'page':
+        page = session.element("browse_page")
+        n_pages = int(page.max) if page.has_max else 1
+        return session.set("browse_page", int_value=rng.randint(1, max(1, n_pages)))
+    if action == 'search':
+        return session.set("search_query", string_value=rng.choice(SEARCH_QUERIES))
+    return ""
+
+
+def open_stream(url):
+    return connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=RUN_TIMEOUT)
+
+
+def run_session(url, session_id, reruns, registers, start_barrier, seed):
+    """One session; returns its samples and whether the app confirmed its registration."""
+    rng = random.Random(seed)
+    samples = []
+    with open_stream(url) as ws:
+        session = Session(ws)
+        start_barrier.wait(timeout=RUN_TIMEOUT)
+        if not timed_run(session, 'load', samples):
+            return samples, 0
+        submitted = 0
+        if registers:
+            fragment_id = register(session, session_id)
+            if timed_run(session, 'register', samples, fragment_id) and registered(session):
+                submitted = 1
+        for _ in range(reruns):
+            action = rng.choice(ACTIONS)
+            try:
+                fragment_id = interact(session, action, rng)
+            except KeyError as e:  # the widget is missing, e.g. after a failed run
+                samples.append((action, 0.0, "error", f"no widget {e}"))
+                continue
+            timed_run(session, action, samples, fragment_id)
+        return samples, submitted
+
+
+# -----------------------------------------------------------------------------
+# Concurrency levels
+# -----------------------------------------------------------------------------
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    values = np.asarray(values)
+    return {
+        'p50': round(float(np.percentile(values, 50)), 4),
+        'p95': round(float(np.percentile(values, 95)), 4),
+        'max': round(float(values.max()), 4),
+    }
+
+
+def run_level(server, url, sandbox, n_sessions, reruns, register_share, seed):
+    registrations_before = registration_count(sandbox)
+    n_registering = math.ceil(n_sessions * register_share)
+    barrier = threading.Barrier(n_sessions + 1)
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        futures = [
+            pool.submit(run_session, url, f"{n_sessions}-{i}", reruns, i < n_registering,
+                        barrier, seed * 1000 + i)
+            for i in range(n_sessions)
+        ]
+        # The clock starts when every session is connected.
+        barrier.wait(timeout=RUN_TIMEOUT)
+        start = time.perf_counter()
+        outcomes = [f.result() for f in futures]
+        wall = time.perf_counter() - start
+
+    samples = [s for session_samples, _ in outcomes for s in session_samples]
+    submitted = sum(n for _, n in outcomes)
+    stored = registration_count(sandbox) - registrations_before
+    ok = [seconds for _, seconds, kind, _ in samples if kind is None]
+    errors = [(kind, message) for _, _, kind, message in samples if kind is not None]
+    return {
+        'sessions': n_sessions,
+        'runs': len(samples),
+        'wall_seconds': round(wall, 3),
+        'throughput_runs_per_second': round(len(ok) / wall, 3) if wall else None,
+        'latency_seconds': percentiles(ok),
+        'latency_by_action': {
+            action: percentiles([s for a, s, kind, _ in samples if a == action and kind is None])
+            for action in ['load', 'register'] + ACTIONS
+        },
+        'server_rss_bytes': rss_bytes(server.pid),
+        'errors': sum(1 for kind, _ in errors if kind == 'error'),
+        'contention_errors': sum(1 for kind, _ in errors if kind == 'contention'),
+        'error_messages': sorted({message.splitlines()[0][:200] for _, message in errors}),
+        'registrations_submitted': submitted,
+        'registrations_stored': stored,
+    }
+
+
+def print_level(result):
+    lat = result['latency_seconds']
+    rss = result['server_rss_bytes']
+    print(f"{result['sessions']:>3} sessions  {result['runs']:>4} runs  "
+          f"{result['throughput_runs_per_second'] or 0:6.2f} runs/s  "
+          f"p50 {lat['p50'] or 0:6.2f}s  p95 {lat['p95'] or 0:6.2f}s  max {lat['max'] or 0:6.2f}s  "
+          + (f"server RSS {rss / 2 ** 20:6.0f} MiB  " if rss else "")
+          + f"errors {result['errors']}  contention {result['contention_errors']}  "
+          f"registrations {result['registrations_stored']}/{result['registrations_submitted']}")
+    for message in result['error_messages']:
+        print(f"      {message}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load-test one streamlit server running app.py with concurrent websocket sessions.")
+    parser.add_argument("--sessions", nargs="+", type=int, default=DEFAULT_SESSIONS,
+                        help="concurrency levels to run (default: 1 2 4 8)")
+    parser.add_argument("--reruns", type=int, default=5,
+                        help="interactions per session after the first page load (default: 5)")
+    parser.add_argument("--register-share", type=float, default=0.5,
+                        help="fraction of sessions that submit the registration form (default: 0.5)")
+    parser.add_argument("--cold", action="store_true",
+                        help="start without the .cache/ snapshots and without a warm-up load, "
+                             "as a fresh deployment would")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="realquami-load-") as sandbox:
+        prepare_sandbox(sandbox, warm=not args.cold)
+        with serve(sandbox) as (server, url):
+            print(f"One streamlit server (pid {server.pid}) at {url}")
+            if not args.cold:
+                with open_stream(url) as ws:
+                    Session(ws).run()
+            for n_sessions in args.sessions:
+                result = run_level(server, url, sandbox, n_sessions, args.reruns, args.register_share, args.seed)
+                print_level(result)
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'reruns': args.reruns, 'cold': args.cold, 'levels': results}, f, indent=2)
+        print(f"Wrote {args.output}")
+    failed = any(r['errors'] or r['contention_errors']
+                 or r['registrations_stored'] != r['registrations_submitted'] for r in results)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Label canonicalization for the REALQUAMI dataset.
+
+The cleanup rules live in LABEL_RULES instead of being spread through app.py.
+Each rule is applied to the distinct labels of a column (a few dozen at most)
+and the result is broadcast back to the rows through the factorized codes, so
+the cost does not depend on how many rows share a label.
+"""
+import numpy as np
+import pandas as pd
+
+import schema
+import telemetry
+
+# Steps run in this order for every column listed:
+#   strip      -> trim surrounding whitespace
+#   missing    -> labels in `missing_values` (and blanks) become this label
+#   case       -> 'lower' or 'title'
+#   replace    -> exact label renames
+LABEL_RULES = {
+    'Caspecialty': {
+        'missing': 'Unknown',
+        'missing_values': ['nan', 'NaN', 'Not stated'],
+        'case': 'lower',
+        'replace': {
+            'family medicine': 'Family medicine',
+            'eye': 'Eye',
+            'unknown': 'Unknown',
+        },
+    },
+    'JournalLoc': {'missing': 'Unknown', 'case': 'title'},
+    'JournalScop': {'missing': 'Unknown', 'case': 'title'},
+    'Class': {
+        'replace': {
+            'mixed': 'Mixed',
+            'others': 'Others',
+            'qualitative': 'Qualitative (include case reports)',
+            'Qualitative (include case reports here)': 'Qualitative (include case reports)',
+            'quantitative': 'Quantitative (include case series)',
+        },
+    },
+    'Level': {
+        'replace': {
+            'primary (include case reports)': 'Primary (include case reports, case series)',
+            'Primary (include case reports)': 'Primary (include case reports, case series)',
+        },
+    },
+    'CatQuanti': {
+        'replace': {
+            'prevalence': 'Prevalence',
+            'etiologic': 'Etiologic',
+        },
+    },
+    'DataCollect': {
+        'replace': {
+            'cross-section': 'Cross-sectional',
+            'cross-sectional': 'Cross-sectional',
+        },
+    },
+}
+
+# Short labels used by the sunburst chart.
+SHORT_LABELS = {
+    'JournalLoc_short': 'JournalLoc',
+    'JournalScop_short': 'JournalScop',
+}
+SHORT_MAX_LEN = 15
+SHORT_KEEP = 10
+
+PERIOD_SPLIT_YEAR = 2000
+PERIOD_LABELS = ('Early (1962-1999)', 'Recent (2000-2019)')
+
+# Columns normalize() adds; every other column of schema.COLUMN_TYPES comes from the CSV.
+DERIVED_COLUMNS = list(SHORT_LABELS) + ['Period']
+
+
+def clean_labels(series, rule):
+    """Apply one LABEL_RULES entry to a column and return the cleaned column."""
+    codes, uniques = pd.factorize(series)
+    # Missing rows have code -1, which picks the trailing NaN slot below.
+    labels = pd.Series(list(uniques) + [np.nan], dtype=object)
+    labels = labels.str.strip()
+
+    if 'missing' in rule:
+        blank = labels.isna() | (labels == '') | labels.isin(rule.get('missing_values', []))
+        labels = labels.mask(blank, rule['missing'])
+    if rule.get('case') == 'lower':
+        labels = labels.str.lower()
+    elif rule.get('case') == 'title':
+        labels = labels.str.title()
+    if 'replace' in rule:
+        labels = labels.replace(rule['replace'])
+
+    return pd.Series(labels.to_numpy()[codes], index=series.index, name=series.name)
+
+
+def shorten_labels(series):
+    """Truncate long labels to SHORT_KEEP characters plus an ellipsis."""
+    return series.where(series.str.len() <= SHORT_MAX_LEN, series.str[:SHORT_KEEP] + "...")
+
+
+def normalize(df):
+    """
+    Return a canonicalized copy of the raw dataset with the derived columns added,
+    in the compact column types of schema.py.
+    """
+    df = df.copy()
+    for col, rule in LABEL_RULES.items():
+        if col in df.columns:
+            with telemetry.span(f"normalize.{col}"):
+                df[col] = clean_labels(df[col], rule)
+
+    with telemetry.span("normalize.short_labels"):
+        for short_col, col in SHORT_LABELS.items():
+            df[short_col] = shorten_labels(df[col])
+
+    df['Period'] = np.where(df['IDyear'] < PERIOD_SPLIT_YEAR, *PERIOD_LABELS)
+    with telemetry.span("normalize.compact"):
+        return schema.compact(df)
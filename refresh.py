@@ -0,0 +1,150 @@
+"""
+Incremental refresh of the clean dataset when a new version of the CSV arrives.
+
+A new upstream version usually adds a few studies or corrects a few cells, yet
+the whole pipeline (normalize, factorize, aggregate) would run again on every
+row. DatasetStore keeps the last build and, for a new version, diffs the rows
+by UniqueID using a hash of each raw row:
+
+- only the added and changed rows are normalized, and they replace the removed
+  and changed rows of the previous clean frame;
+- the aggregate cube is updated with the counts of the rows that left and
+  arrived (AggregateCube.updated) instead of being rebuilt.
+
+The clean frame keeps the row order of the new CSV, so it is the frame a full
+build would give. Charts are cached by the digest of the cube parts they read
+(charts.input_digest), so a chart whose inputs the delta did not touch is not
+redrawn. A full build is done on first use, when UniqueID is missing or not
+unique, or when more than MAX_DELTA_SHARE of the rows changed.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import schema
+import telemetry
+from aggregates import AggregateCube, ColumnCodes
+from normalize import normalize
+
+ID_COLUMN = 'UniqueID'
+MAX_DELTA_SHARE = 0.5  # above this, rebuilding is as cheap as patching
+
+
+def row_hashes(raw):
+    """Hash of every raw row indexed by UniqueID, or None if the ids cannot key the rows."""
+    if ID_COLUMN not in raw.columns or raw[ID_COLUMN].isna().any() or not raw[ID_COLUMN].is_unique:
+        return None
+    hashes = pd.util.hash_pandas_object(raw, index=False, categorize=False)
+    return pd.Series(hashes.to_numpy(), index=pd.Index(raw[ID_COLUMN].to_numpy(), name=ID_COLUMN))
+
+
+class Delta:
+    """UniqueIDs added, removed and changed between two versions of the dataset."""
+
+    def __init__(self, old_hashes, new_hashes):
+        self.added = new_hashes.index.difference(old_hashes.index)
+        self.removed = old_hashes.index.difference(new_hashes.index)
+        common = new_hashes.index.intersection(old_hashes.index)
+        differs = new_hashes.loc[common].to_numpy() != old_hashes.loc[common].to_numpy()
+        self.changed = common[differs]
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+class Dataset:
+    """One version of the dataset: the clean frame and what the dashboard builds from it."""
+
+    def __init__(self, version, clean, codes, cube, hashes, delta=None):
+        self.version = version
+        self.clean = clean
+        self.codes = codes
+        self.cube = cube
+        self.hashes = hashes
+        self.delta = delta  # None after a full build
+
+
+def _positions(clean, ids):
+    return np.flatnonzero(clean[ID_COLUMN].isin(ids).to_numpy())
+
+
+def _patch(base, raw, delta):
+    """The clean frame and cube of `raw`, from the previous build and the delta."""
+    with telemetry.span("refresh.normalize", rows=len(delta.added) + len(delta.changed)):
+        fresh = normalize(raw[raw[ID_COLUMN].isin(delta.added.union(delta.changed))])
+    gone = delta.removed.union(delta.changed)
+    gone_rows = _positions(base.clean, gone)
+    kept = base.clean.drop(index=base.clean.index[gone_rows])
+
+    # Categoricals only concatenate as categoricals when the categories agree.
+    for col in kept.columns:
+        if isinstance(kept[col].dtype, pd.CategoricalDtype) and isinstance(fresh[col].dtype, pd.CategoricalDtype):
+            categories = kept[col].cat.categories.union(fresh[col].cat.categories)
+            kept[col] = kept[col].cat.set_categories(categories)
+            fresh[col] = fresh[col].cat.set_categories(categories)
+    clean = pd.concat([kept, fresh])
+    # Back into the order of the new CSV, with the compact types of a full build.
+    order = pd.Index(raw[ID_COLUMN]).get_indexer(clean[ID_COLUMN])
+    clean = clean.iloc[np.argsort(order, kind='stable')]
+    clean.index = raw.index
+    clean = schema.compact(clean)
+    for col in clean.columns:
+        if isinstance(clean[col].dtype, pd.CategoricalDtype):
+            clean[col] = clean[col].cat.remove_unused_categories()
+
+    with telemetry.span("refresh.aggregate"):
+        codes = ColumnCodes(clean)
+        removed = AggregateCube(base.codes, gone_rows)
+        added = AggregateCube(codes, _positions(clean, fresh[ID_COLUMN]))
+        cube = base.cube.updated(codes, added, removed)
+    return clean, codes, cube
+
+
+class DatasetStore:
+    """
+    Thread-safe builder of Dataset objects; the last `keep` versions are kept so
+    sessions still on the previous version finish their rerun.
+    """
+
+    def __init__(self, keep=2):
+        self.keep = keep
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        with self._lock:
+            if version not in self._datasets:
+                base = next(reversed(self._datasets.values()), None)
+                self._datasets[version] = self._build(version, base)
+                while len(self._datasets) > self.keep:
+                    self._datasets.popitem(last=False)
+            return self._datasets[version]
+
+    def load_raw(self, version):
+        """The raw frame of a version; check_refresh.py substitutes synthetic versions."""
+        return dataset.load_data(version)
+
+    def _build(self, version, base):
+        raw = self.load_raw(version)
+        with telemetry.span("refresh.diff"):
+            hashes = row_hashes(raw)
+            delta = None
+            if base is not None and base.hashes is not None and hashes is not None:
+                delta = Delta(base.hashes, hashes)
+        if delta is not None and len(delta) <= MAX_DELTA_SHARE * len(raw):
+            with telemetry.span("refresh.incremental", added=len(delta.added),
+                                changed=len(delta.changed), removed=len(delta.removed)):
+                clean, codes, cube = _patch(base, raw, delta)
+            return Dataset(version, clean, codes, cube, hashes, delta)
+
+        with telemetry.span("refresh.full"):
+            clean = normalize(raw)
+            codes = ColumnCodes(clean)
+            cube = AggregateCube(codes)
+        return Dataset(version, clean, codes, cube, hashes)
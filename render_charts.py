@@ -0,0 +1,162 @@
+"""
+Render every dashboard chart to disk without starting Streamlit.
+
+    python render_charts.py                          # all charts, 300 dpi PNG, into charts/
+    python render_charts.py --dpi 150 300 600 --format png svg pdf
+    python render_charts.py --charts caspecialty period_bars --output /tmp/figures
+
+The charts are the same functions the dashboard uses (charts.CHARTS), fed from
+the same Parquet snapshot and AggregateCube. Each (chart, format, dpi) is one
+job on a process pool: matplotlib is not thread-safe, so separate processes are
+the only way to render in parallel. Every worker loads the dataset and builds
+the cube once, in its initializer.
+
+Files are named <stem>_<dpi>dpi.<format> after charts.FILE_STEMS; the Plotly
+sunburst is written once as <stem>.html. A manifest in the output folder
+records, per file, a key made of the dataset version and the source of the
+chart code, so a rerun only renders what changed (or everything, with --force).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import charts
+import dataset
+from dataset import BASE_DIR, atomic_write
+
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "charts")
+MANIFEST_NAME = ".render-manifest.json"
+FORMATS = ['png', 'svg', 'pdf']
+SUNBURST = 'journal_sunburst'
+
+# Modules whose source decides what a chart looks like.
+CODE_MODULES = ['charts.py', 'aggregates.py', 'normalize.py']
+
+_cube = None
+
+
+def code_version(modules=CODE_MODULES):
+    digest = hashlib.sha256()
+    for name in modules:
+        with open(os.path.join(BASE_DIR, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def output_name(chart, fmt, dpi):
+    if chart == SUNBURST:
+        return f"{charts.FILE_STEMS[chart]}.html"
+    return f"{charts.FILE_STEMS[chart]}_{dpi}dpi.{fmt}"
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# -----------------------------------------------------------------------------
+# Worker side
+# -----------------------------------------------------------------------------
+def _init_worker(version):
+    global _cube
+    from aggregates import CHART_COLUMNS, AggregateCube
+    from normalize import normalize
+
+    _cube = AggregateCube.from_frame(normalize(dataset.load_data(version, columns=CHART_COLUMNS)))
+
+
+def _render_job(chart, fmt, dpi, path):
+    start = time.perf_counter()
+    if chart == SUNBURST:
+        data = charts.journal_sunburst(_cube).to_html(include_plotlyjs='cdn').encode("utf-8")
+    else:
+        data = charts.render(chart, _cube, fmt, dpi)
+    atomic_write(path, data)
+    return time.perf_counter() - start
+
+
+# -----------------------------------------------------------------------------
+# Command line
+# -----------------------------------------------------------------------------
+def parse_args(argv=None):
+    names = list(charts.CHARTS) + [SUNBURST]
+    parser = argparse.ArgumentParser(description="Render the REALQUAMI dashboard charts to files.")
+    parser.add_argument("--charts", nargs="+", choices=names, default=names, metavar="NAME",
+                        help="charts to render (default: all): " + ", ".join(names))
+    parser.add_argument("--dpi", nargs="+", type=int, default=[300],
+                        help="one or more resolutions (default: 300)")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=['png'], dest="formats",
+                        help="one or more output formats (default: png)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="output folder (default: charts/ next to app.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of rendering processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="render every file even if its inputs did not change")
+    return parser.parse_args(argv)
+
+
+def plan(args, version, code):
+    """{file name: (chart, fmt, dpi, key)} for every file this run should produce."""
+    jobs = {}
+    for chart in args.charts:
+        # The HTML sunburst does not depend on format or resolution.
+        variants = [('html', None)] if chart == SUNBURST else [(f, d) for f in args.formats for d in args.dpi]
+        for fmt, dpi in variants:
+            key = hashlib.sha256(f"{version}:{code}:{chart}:{fmt}:{dpi}".encode("utf-8")).hexdigest()
+            jobs[output_name(chart, fmt, dpi)] = (chart, fmt, dpi, key)
+    return jobs
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    version = dataset.dataset_version()
+    dataset.load_data(version)  # build the snapshot once, before the workers start
+    jobs = plan(args, version, code_version())
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest = read_manifest(args.output)
+    todo = {
+        name: job for name, job in jobs.items()
+        if args.force
+        or manifest.get(name) != job[3]
+        or not os.path.exists(os.path.join(args.output, name))
+    }
+    print(f"{len(jobs)} files, {len(jobs) - len(todo)} unchanged, {len(todo)} to render")
+    if not todo:
+        return 0
+
+    start = time.perf_counter()
+    failed = 0
+    workers = max(1, min(args.workers or 1, len(todo)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(version,)) as pool:
+        futures = {
+            pool.submit(_render_job, chart, fmt, dpi, os.path.join(args.output, name)): name
+            for name, (chart, fmt, dpi, _) in todo.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                seconds = future.result()
+            except Exception as e:
+                failed += 1
+                manifest.pop(name, None)
+                print(f"  failed    {name}: {e}", file=sys.stderr)
+                continue
+            manifest[name] = todo[name][3]
+            print(f"  rendered  {name} ({seconds:.1f}s)")
+
+    atomic_write(os.path.join(args.output, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    print(f"Done in {time.perf_counter() - start:.1f}s with {workers} workers")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Column schema of the REALQUAMI dataset and its compact in-memory representation.
+
+COLUMN_TYPES gives every column of REALQUAMI_Dataset_Merged.csv (plus the
+columns normalize.py derives) one of these kinds:
+
+    id        row identifier            -> smallest integer type that fits
+    year      publication year          -> int16
+    count     small counts (may be NA)  -> smallest nullable integer that fits
+    category  a few hundred labels max  -> pandas categorical, sorted categories
+    text      free text                 -> left as read
+
+compact() applies it. A categorical stores each row as a one or two byte code
+into a sorted list of labels, so group-bys and value counts work on the codes
+and aggregates.ColumnCodes can take them as they are instead of factorizing.
+Columns not listed are left alone.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMN_TYPES = {
+    'UniqueID': 'id',
+    'IDname': 'text',
+    'IDyear': 'year',
+    'Title': 'text',
+    'CAname': 'text',
+    'CAinst1': 'text',
+    'CAcountry': 'category',
+    'CAinst2': 'text',
+    'CAcountry2': 'category',
+    'Caspecialty': 'category',
+    'Caquali': 'category',
+    'AuthorNum': 'count',
+    'InstitNum': 'count',
+    'AuthorOvNum': 'count',
+    'InstitOvNum': 'count',
+    'SpecialtyNum': 'category',
+    'JournalName(fullname)': 'text',
+    'JournalLoc': 'category',
+    'JournalScop': 'category',
+    'JournalSubscribe': 'count',
+    'Article': 'category',
+    'Field': 'category',
+    'Level': 'category',
+    'Class': 'category',
+    'CatQuanti': 'category',
+    'DataCollect': 'category',
+    'Began': 'text',
+    'Completed': 'text',
+    'StudySitesNum': 'text',
+    'Setting': 'category',
+    'Setting.1': 'category',
+    'Condition_primary': 'category',
+    'Condition_secondary': 'category',
+    'SubjMeasure': 'category',
+    'ObjMeasure': 'category',
+    'Intervention': 'category',
+    # Derived in normalize.py
+    'JournalLoc_short': 'category',
+    'JournalScop_short': 'category',
+    'Period': 'category',
+}
+
+NULLABLE_INTS = ['Int8', 'Int16', 'Int32', 'Int64']
+
+
+def columns_of(kind):
+    return [col for col, col_kind in COLUMN_TYPES.items() if col_kind == kind]
+
+
+def _smallest_nullable_int(series):
+    values = pd.to_numeric(series, errors='coerce')
+    present = values.dropna()
+    if len(present) and not np.array_equal(present, present.round()):
+        return values.astype('float32')  # not whole numbers after all
+    low, high = (present.min(), present.max()) if len(present) else (0, 0)
+    for dtype in NULLABLE_INTS:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _category(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    categories = pd.Index(series.dropna().unique()).sort_values()
+    return pd.Series(pd.Categorical(series, categories=categories), index=series.index, name=series.name)
+
+
+def compact(df):
+    """Cast the columns of `df` (in place) to the compact types of COLUMN_TYPES; returns df."""
+    for col in df.columns:
+        kind = COLUMN_TYPES.get(col)
+        if kind == 'id':
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif kind == 'year':
+            df[col] = df[col].astype(np.int16)
+        elif kind == 'count':
+            df[col] = _smallest_nullable_int(df[col])
+        elif kind == 'category':
+            df[col] = _category(df[col])
+    return df
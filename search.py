@@ -0,0 +1,131 @@
+"""
+Full-text search over the studies.
+
+SearchIndex is a tokenized inverted index over SEARCH_COLUMNS with BM25
+ranking. The postings are stored as flat numpy arrays (CSR layout: for term t,
+the documents are doc_ids[term_ptr[t]:term_ptr[t + 1]] with term frequencies
+in the same slice of tfs), so a query only touches the postings of its own
+terms. A last query term that is not a whole word yet is expanded to the
+words it prefixes, which keeps results useful while the user is still typing.
+
+The index is built once per dataset version and pickled to .cache/, so a
+restarted process loads it instead of re-tokenizing.
+"""
+import bisect
+import glob
+import os
+import pickle
+import re
+
+import numpy as np
+import pandas as pd
+
+from dataset import CACHE_DIR, atomic_write
+
+SEARCH_COLUMNS = ['Title', 'JournalName(fullname)', 'CAname', 'CAinst1', 'Setting']
+RESULT_COLUMNS = ['IDyear'] + SEARCH_COLUMNS
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_PREFIX_TERMS = 50  # expansions of the last, still-being-typed term
+INDEX_FORMAT = 1  # bump when SearchIndex changes, so old pickles are rebuilt
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """BM25 inverted index over one version of the dataset."""
+
+    def __init__(self, df):
+        columns = [df[col].astype("string").fillna("") for col in SEARCH_COLUMNS if col in df.columns]
+        texts = columns[0]
+        for col in columns[1:]:
+            texts = texts + " " + col
+        texts = texts.reset_index(drop=True)
+        self.n_docs = len(texts)
+
+        # One row per token occurrence, then one entry per (term, doc) pair.
+        tokens = texts.str.lower().str.findall(TOKEN_RE.pattern).explode().dropna()
+        docs = tokens.index.to_numpy(dtype=np.int64)
+        term_codes, terms = pd.factorize(tokens, sort=True)
+        keys, tfs = np.unique(term_codes.astype(np.int64) * self.n_docs + docs, return_counts=True)
+        sizes = np.bincount(keys // self.n_docs, minlength=len(terms))
+
+        self.terms = list(terms)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.term_ptr = np.concatenate([[0], np.cumsum(sizes)])
+        self.doc_ids = (keys % self.n_docs).astype(np.int32)
+        self.tfs = tfs.astype(np.float32)
+        self.idf = np.log(1 + (self.n_docs - sizes + 0.5) / (sizes + 0.5)).astype(np.float32)
+        self.doc_lengths = np.bincount(docs, minlength=self.n_docs)
+        self.avg_length = float(self.doc_lengths.mean()) if self.n_docs else 0.0
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self.terms, prefix)
+        matches = []
+        for term in self.terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(self.term_ids[term])
+        return matches
+
+    def search(self, query, limit=50, rows=None):
+        """
+        Rank documents for a query. Returns (positions, scores), best first.
+        `rows`, if given, restricts the results to those row positions.
+        """
+        tokens = tokenize(query)
+        if not tokens or not self.n_docs:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        term_ids = [self.term_ids[t] for t in tokens[:-1] if t in self.term_ids]
+        last = tokens[-1]
+        if last in self.term_ids:
+            term_ids.append(self.term_ids[last])
+        else:
+            term_ids.extend(self._prefix_terms(last))
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / self.avg_length)
+        for term_id in term_ids:
+            lo, hi = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.tfs[lo:hi]
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+
+        if rows is not None:
+            allowed = np.zeros(self.n_docs, dtype=bool)
+            allowed[rows] = True
+            scores[~allowed] = 0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit)[:limit]]
+        order = matched[np.argsort(-scores[matched], kind='stable')]
+        return order, scores[order]
+
+
+def index_path(version):
+    return os.path.join(CACHE_DIR, f"search-{version[:16]}-v{INDEX_FORMAT}.pkl")
+
+
+def load_index(version, df):
+    """Load the pickled index for this version, building and saving it if missing."""
+    path = index_path(version)
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    index = SearchIndex(df)
+    atomic_write(path, pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+    for old in glob.glob(os.path.join(CACHE_DIR, "search-*.pkl")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return index
@@ -0,0 +1,129 @@
+"""
+Per-stage timing for the dashboard.
+
+    with telemetry.span("load", cached=True):
+        df = load_clean_data(version)
+
+A span records its wall time, the change in process RSS while it ran and, for
+stages behind a cache, whether the cache was hit: a cached function calls
+telemetry.miss() in its body, which only runs on a miss, and that marks every
+open cached span of the calling thread. Spans nest, so a miss deep inside a
+cached loader is charged to the enclosing "load" span as well.
+
+Every finished span is written as one JSON line to .cache/spans.jsonl (rotated)
+and kept in a rolling window per name, which summary() turns into percentiles
+for the admin panel. RSS is process-wide, so with concurrent sessions the delta
+of a span also includes whatever the other sessions allocated meanwhile.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+# Not imported from dataset, which is itself instrumented.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+LOG_FILE = os.path.join(CACHE_DIR, "spans.jsonl")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+WINDOW = 500  # spans kept per name for the rolling percentiles
+
+_local = threading.local()
+_lock = threading.Lock()
+_recent = defaultdict(lambda: deque(maxlen=WINDOW))
+_logger = logging.getLogger("realquami.spans")
+
+
+def _open_log():
+    if _logger.handlers:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class span:
+    """Context manager timing one stage; see the module docstring."""
+
+    def __init__(self, name, cached=False, **fields):
+        self.name = name
+        self.cache = "hit" if cached else None
+        self.fields = fields
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self._rss = rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        rss = rss_bytes()
+        _local.stack.pop()
+        record = {
+            "ts": round(time.time(), 3),
+            "span": self.name,
+            "ms": round(seconds * 1000, 3),
+            "cache": self.cache,
+            "rss_delta": rss - self._rss if rss is not None and self._rss is not None else None,
+            "thread": threading.current_thread().name,
+            "error": exc_type.__name__ if exc_type else None,
+            **self.fields,
+        }
+        with _lock:
+            _recent[self.name].append(record)
+            _open_log()
+        _logger.info(json.dumps(record, default=str))
+        return False
+
+
+def miss():
+    """Mark the open cached spans of this thread as cache misses."""
+    for open_span in getattr(_local, "stack", ()):
+        if open_span.cache is not None:
+            open_span.cache = "miss"
+
+
+def summary():
+    """Rolling percentiles per span name, slowest p95 first."""
+    with _lock:
+        windows = {name: list(records) for name, records in _recent.items()}
+    rows = []
+    for name, records in windows.items():
+        ms = np.array([r["ms"] for r in records])
+        cached = [r["cache"] for r in records if r["cache"] is not None]
+        rss = [r["rss_delta"] for r in records if r["rss_delta"] is not None]
+        rows.append({
+            "span": name,
+            "count": len(records),
+            "p50 ms": round(float(np.percentile(ms, 50)), 1),
+            "p95 ms": round(float(np.percentile(ms, 95)), 1),
+            "max ms": round(float(ms.max()), 1),
+            "hit rate": round(cached.count("hit") / len(cached), 2) if cached else None,
+            "mean RSS delta MiB": round(float(np.mean(rss)) / 2**20, 2) if rss else None,
+        })
+    if not rows:
+        return pd.DataFrame(columns=["span", "count", "p50 ms", "p95 ms", "max ms", "hit rate", "mean RSS delta MiB"])
+    return pd.DataFrame(rows).sort_values("p95 ms", ascending=False, ignore_index=True)
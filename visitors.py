@@ -0,0 +1,154 @@
+"""
+Visitor counter and registration store.
+
+Everything lives in one SQLite database (visitors.db) in WAL mode, so readers
+never block the writer and every update is a short transaction:
+
+- the page-view counter is a single-row UPDATE, atomic across sessions and
+  processes;
+- a registration is one INSERT, plus a counter bump in the same transaction,
+  so the registered count is read from one row instead of counting the table.
+
+The legacy visitor_count.txt and visitor_data.csv are imported once, when the
+database is first created.
+"""
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+from dataset import BASE_DIR
+
+DB_FILE = os.path.join(BASE_DIR, "visitors.db")
+LEGACY_COUNT_FILE = os.path.join(BASE_DIR, "visitor_count.txt")
+LEGACY_DATA_FILE = os.path.join(BASE_DIR, "visitor_data.csv")
+
+BUSY_TIMEOUT = 10  # seconds to wait for another writer
+
+# CSV column -> table column
+REGISTRATION_FIELDS = {
+    "First Name": "first_name",
+    "Last Name": "last_name",
+    "Email": "email",
+    "Affiliation": "affiliation",
+    "Purpose": "purpose",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS registrations (
+    id          INTEGER PRIMARY KEY,
+    first_name  TEXT NOT NULL,
+    last_name   TEXT NOT NULL,
+    email       TEXT NOT NULL,
+    affiliation TEXT,
+    purpose     TEXT,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS registrations_email ON registrations (email);
+"""
+
+
+class VisitorStore:
+    """Thread-safe handle on visitors.db. One instance is shared per process."""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        # Streamlit runs each rerun on a fresh thread, so one connection is
+        # shared behind a lock; other processes are serialized by SQLite itself.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._initialise()
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def _initialise(self):
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM counters WHERE name = 'visits'").fetchone()
+            if row is not None:
+                return
+            conn.execute("INSERT INTO counters VALUES ('visits', ?)", (_legacy_visit_count(),))
+            rows = _legacy_registrations()
+            conn.executemany(
+                "INSERT INTO registrations (first_name, last_name, email, affiliation, purpose, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("INSERT INTO counters VALUES ('registrations', ?)", (len(rows),))
+
+    def record_visit(self):
+        """Increment the page-view counter and return the new total."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'visits'")
+            return conn.execute("SELECT value FROM counters WHERE name = 'visits'").fetchone()[0]
+
+    def add_registration(self, data):
+        """Store one registration (a dict keyed like REGISTRATION_FIELDS)."""
+        values = [data.get(field, "") for field in REGISTRATION_FIELDS]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO registrations (first_name, last_name, email, affiliation, purpose, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values + [time.time()],
+            )
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'registrations'")
+
+    def counts(self):
+        """(total visits, registered visitors), read from the counter rows."""
+        with self._lock:
+            rows = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return rows.get("visits", 0), rows.get("registrations", 0)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT under the store's lock, rolled back on error."""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+def _legacy_visit_count():
+    try:
+        with open(LEGACY_COUNT_FILE, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def _legacy_registrations():
+    if not os.path.exists(LEGACY_DATA_FILE):
+        return []
+    created_at = os.path.getmtime(LEGACY_DATA_FILE)
+    with open(LEGACY_DATA_FILE, newline="", encoding="utf-8") as f:
+        return [
+            [row.get(field, "") for field in REGISTRATION_FIELDS] + [created_at]
+            for row in csv.DictReader(f)
+        ]